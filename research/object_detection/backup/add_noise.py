@@ -23,6 +23,7 @@ import functools
 
 import tensorflow as tf
 
+from object_detection import half_precision
 from object_detection.builders import optimizer_builder
 from object_detection.builders import preprocessor_builder
 from object_detection.core import batcher
@@ -39,6 +40,8 @@ slim = tf.contrib.slim
 flags = tf.app.flags
 FLAGS = flags.FLAGS
 
+jit_scope = tf.contrib.compiler.jit.experimental_jit_scope
+
 def _batch_norm_arg_scope(list_ops,
                           use_batch_norm=True,
                           batch_norm_decay=0.9997,
@@ -65,67 +68,99 @@ def _batch_norm_arg_scope(list_ops,
 def optimistic_restore(session, save_file):
   reader = tf.train.NewCheckpointReader(save_file)
   saved_shapes = reader.get_variable_to_shape_map()
-  var_names = sorted([(var.name, var.name.split(':')[0]) for var in tf.global_variables()
-                  if var.name.split(':')[0] in saved_shapes])
-  restore_vars = []
-  name2var = dict(zip(map(lambda x:x.name.split(':')[0], tf.global_variables()), tf.global_variables()))
-  with tf.variable_scope('', reuse=True):
-    for var_name, saved_var_name in var_names:
-      curr_var = name2var[saved_var_name]
-      var_shape = curr_var.get_shape().as_list()
-      if var_shape == saved_shapes[saved_var_name]:
-        restore_vars.append(curr_var)
+  name2var = {var.name.split(':')[0]: var for var in tf.global_variables()}
+  restore_vars = [var for name, var in name2var.items()
+                  if name in saved_shapes and
+                  var.get_shape().as_list() == saved_shapes[name]]
   saver = tf.train.Saver(restore_vars)
   saver.restore(session, save_file)
 
 
 def create_input_queue(batch_size_per_clone, create_tensor_dict_fn,
                        batch_queue_capacity, num_batch_queue_threads,
-                       prefetch_queue_capacity, data_augmentation_options):
-  """Sets up reader, prefetcher and returns input queue.
+                       prefetch_queue_capacity, data_augmentation_options,
+                       prefetch_device=None):
+  """Sets up a tf.data input pipeline and returns input queue.
+
+  Data augmentation and noise injection run in the tf.data map stage, so that
+  they overlap with the model on the training device.
 
   Args:
     batch_size_per_clone: batch size to use per clone.
-    create_tensor_dict_fn: function to create tensor dictionary.
-    batch_queue_capacity: maximum number of elements to store within a queue.
-    num_batch_queue_threads: number of threads to use for batching.
-    prefetch_queue_capacity: maximum capacity of the queue used to prefetch
-                             assembled batches.
+    create_tensor_dict_fn: function like dataset_builder.build to create a
+      tf.data.Dataset of tensor dictionaries; the preprocessing function is
+      passed to it as transform_input_data_fn.
+    batch_queue_capacity: maximum number of elements to prefetch.
+    num_batch_queue_threads: number of elements to preprocess in parallel.
+    prefetch_queue_capacity: maximum number of elements to stage on
+      prefetch_device.
     data_augmentation_options: a list of tuples, where each tuple contains a
       data augmentation function and a dictionary containing arguments and their
       values (see preprocessor.py).
+    prefetch_device: optional device to stage the preprocessed tensor_dicts
+      on, e.g. the GPU of the clone consuming them. String fields cannot be
+      copied to GPU memory and are dropped then, so the image keys are empty.
+      If None, the tensor_dicts stay on the input device until they are
+      dequeued.
 
   Returns:
-    input queue: a batcher.BatchQueue object holding enqueued tensor_dicts
-      (which hold images, boxes and targets).  To get a batch of tensor_dicts,
-      call input_queue.Dequeue().
+    input queue: a batcher.DatasetQueue object holding tensor_dicts
+      (which hold images, noisy images, boxes and targets).  To get a batch of
+      tensor_dicts, call input_queue.dequeue().
   """
-  tensor_dict = create_tensor_dict_fn()
-
-  tensor_dict[fields.InputDataFields.image] = tf.expand_dims(
-      tensor_dict[fields.InputDataFields.image], 0)
-
-  images = tensor_dict[fields.InputDataFields.image]
-  float_images = tf.to_float(images)
-  tensor_dict[fields.InputDataFields.image] = float_images
-
-  include_instance_masks = (fields.InputDataFields.groundtruth_instance_masks
-                            in tensor_dict)
-  include_keypoints = (fields.InputDataFields.groundtruth_keypoints
-                       in tensor_dict)
-  if data_augmentation_options:
-    tensor_dict = preprocessor.preprocess(
-        tensor_dict, data_augmentation_options,
-        func_arg_map=preprocessor.get_default_func_arg_map(
-            include_instance_masks=include_instance_masks,
-            include_keypoints=include_keypoints))
-
-  input_queue = batcher.BatchQueue(
-      tensor_dict,
-      batch_size=batch_size_per_clone,
-      batch_queue_capacity=batch_queue_capacity,
-      num_batch_queue_threads=num_batch_queue_threads,
-      prefetch_queue_capacity=prefetch_queue_capacity)
+  def preprocess_fn(tensor_dict):
+    """Preprocesses a single tensor_dict and adds its noisy image.
+
+    The noise is added here, at the resolution of the decoded image, because
+    detection_model.preprocess is not available in the input pipeline. The
+    noisy and clean images are resized together by it later, so the resizer
+    also interpolates the noise, and the lowres subsample factor and the snow
+    size are relative to the source image. This is the same order as in
+    evaluator.py, so the noise seen in training and evaluation match. The
+    [-1, 1] mapping is only the value range of the noise functions; the noisy
+    image is mapped back to [0, 255] before the feature extractor's own
+    preprocessing.
+    """
+    tensor_dict[fields.InputDataFields.image] = tf.expand_dims(
+        tensor_dict[fields.InputDataFields.image], 0)
+
+    images = tensor_dict[fields.InputDataFields.image]
+    float_images = tf.to_float(images)
+    tensor_dict[fields.InputDataFields.image] = float_images
+
+    include_instance_masks = (fields.InputDataFields.groundtruth_instance_masks
+                              in tensor_dict)
+    include_keypoints = (fields.InputDataFields.groundtruth_keypoints
+                         in tensor_dict)
+    if data_augmentation_options:
+      tensor_dict = preprocessor.preprocess(
+          tensor_dict, data_augmentation_options,
+          func_arg_map=preprocessor.get_default_func_arg_map(
+              include_instance_masks=include_instance_masks,
+              include_keypoints=include_keypoints))
+
+    if FLAGS.lowres or FLAGS.snow or FLAGS.gaussian_noise or FLAGS.salt_pepper_noise:
+      # noise functions expect pixel values in [-1, 1]
+      image = inception_preprocess(tensor_dict[fields.InputDataFields.image])
+      noisy_image = add_noise([image])[0]
+      tensor_dict[fields.InputDataFields.noisy_image] = inception_depreprocess(
+          noisy_image)
+    if prefetch_device:
+      # string fields, e.g. source_id and filename, stay on the host.
+      tensor_dict = {key: value for key, value in tensor_dict.items()
+                     if value.dtype != tf.string}
+    return tensor_dict
+
+  dataset = create_tensor_dict_fn(
+      num_parallel_calls=num_batch_queue_threads,
+      transform_input_data_fn=preprocess_fn)
+  dataset = dataset.prefetch(batch_queue_capacity)
+  if prefetch_device:
+    # must be the last transformation of the input pipeline
+    dataset = dataset.apply(tf.contrib.data.prefetch_to_device(
+        prefetch_device, buffer_size=prefetch_queue_capacity))
+
+  input_queue = batcher.DatasetQueue(dataset, batch_size=batch_size_per_clone)
   return input_queue
 
 
@@ -133,7 +168,7 @@ def get_inputs(input_queue, num_classes, merge_multiple_label_boxes=False):
   """Dequeues batch and constructs inputs to object detection model.
 
   Args:
-    input_queue: BatchQueue object holding enqueued tensor_dicts.
+    input_queue: DatasetQueue object holding tensor_dicts.
     num_classes: Number of classes.
     merge_multiple_label_boxes: Whether to merge boxes with multiple labels
       or not. Defaults to false. Merged boxes are represented with a single
@@ -152,6 +187,8 @@ def get_inputs(input_queue, num_classes, merge_multiple_label_boxes=False):
     keypoints_list: a list of 3-D float tensors of shape [num_boxes,
       num_keypoints, 2] containing keypoints for objects if present in the
       input queue. Else returns None.
+    noisy_images: a list of 3-D float tensor of noisy images if noise is
+      injected in the input pipeline. Else returns None.
   """
   read_data_list = input_queue.dequeue()
   label_id_offset = 1
@@ -176,7 +213,9 @@ def get_inputs(input_queue, num_classes, merge_multiple_label_boxes=False):
     if (merge_multiple_label_boxes and (
         masks_gt is not None or keypoints_gt is not None)):
       raise NotImplementedError('Multi-label support is only for boxes.')
-    return image, key, location_gt, classes_gt, masks_gt, keypoints_gt
+    noisy_image = read_data.get(fields.InputDataFields.noisy_image)
+    return (image, key, location_gt, classes_gt, masks_gt, keypoints_gt,
+            noisy_image)
 
   return zip(*map(extract_images_and_targets, read_data_list))
 
@@ -187,20 +226,14 @@ def get_salt_pepper_noise_image(image, ratio=0.01, rand_ratio=False):
   height = image_shape[1]
   width = image_shape[2]
 
-  # uniform [1 - ratio, 2 - ratio)
-  ratio = tf.random_uniform([], maxval=ratio) if rand_ratio else ratio
-  random_tensor = 1. - ratio
-  random_tensor += tf.random_uniform(image_shape)
-  # 0: ratio, 1: 1 - ratio
-  binary_tensor = tf.floor(random_tensor)
-
-  # scale image from [-1, 1] to [0, 1]
-  random_tensor2 = tf.random_uniform(image_shape)
-  image = (image + 1.)/2.
-  noise_image = binary_tensor*image + (1.-binary_tensor)*random_tensor2
+  # the ratio is sampled per image so that a batched call matches per-image calls
+  ratio = tf.random_uniform([num_batch, 1, 1, 1], maxval=ratio) if rand_ratio else ratio
+  # False: ratio, True: 1 - ratio
+  keep_mask = tf.random_uniform(image_shape) >= ratio
 
-  # scaling pixel values to be in [-1, 1]).
-  noise_image = tf.clip_by_value(noise_image*2.-1, -1, 1)
+  # noise pixels are drawn directly in [-1, 1], the range of the image.
+  random_tensor2 = tf.random_uniform(image_shape, minval=-1., maxval=1.)
+  noise_image = tf.where(keep_mask, image, random_tensor2)
   return noise_image
 
 def get_gaussian_noise_image(image, stddev=0.15, rand_stddev=False):
@@ -211,22 +244,24 @@ def get_gaussian_noise_image(image, stddev=0.15, rand_stddev=False):
   width = image_shape[2]
   
   if rand_stddev:
-    sigma = tf.abs(tf.truncated_normal([num_batch], mean=0., stddev=stddev/2))
+    sigma = tf.abs(tf.truncated_normal([num_batch, 1, 1, 1], mean=0.,
+                                       stddev=stddev/2))
   else:
     sigma = stddev
   # since preprocessed input values are in [-1, 1], we use sigma*2
-  noise = tf.random_normal(image_shape, mean=0., stddev=sigma*2)
+  noise = tf.random_normal(image_shape) * (sigma*2)
   # scaling pixel values to be in [-1, 1]).
   noise_image = tf.clip_by_value(image + noise, -1, 1)
   return noise_image
 
 def get_snow_image(image, sparsity=0.05):
-  # image shape: [1, None, None, 3]
+  # image shape: [num_batch, None, None, 3]
 
-  image_shape = image.get_shape().as_list()
+  image_shape = tf.shape(image)
+  num_batch = image_shape[0]
   height = image_shape[1]
   width = image_shape[2]
-  
+
   # assume the size of the snow ball is 24.
   #    **
   #   ****
@@ -234,11 +269,34 @@ def get_snow_image(image, sparsity=0.05):
   #  ******
   #   ****
   #    **
+  snowball = tf.constant([[0, 0, 1, 1, 0, 0],
+                          [0, 1, 1, 1, 1, 0],
+                          [1, 1, 1, 1, 1, 1],
+                          [1, 1, 1, 1, 1, 1],
+                          [0, 1, 1, 1, 1, 0],
+                          [0, 0, 1, 1, 0, 0]], dtype=tf.float32)
   # based on sparsity we calculate the number of snow balls in a image
-  num_snows = int(height*width*sparsity/24)
-  
-  snow_rows = tf.random_uniform([num_snows], 0, height, dtype=tf.int32)
-  snow_cols = tf.random_uniform([num_snows], 0, width, dtype=tf.int32)
+  num_snows = tf.to_int32(tf.to_float(height*width)*sparsity/24)
+
+  batch_ids = tf.tile(tf.expand_dims(tf.range(num_batch), 1), [1, num_snows])
+  snow_rows = tf.random_uniform([num_batch, num_snows], 0, height,
+                                dtype=tf.int32)
+  snow_cols = tf.random_uniform([num_batch, num_snows], 0, width,
+                                dtype=tf.int32)
+  indices = tf.reshape(tf.stack([batch_ids, snow_rows, snow_cols], axis=-1),
+                       [-1, 3])
+  # mark the snow ball centers, then stamp all snow balls with a single conv
+  # instead of scattering each of their pixels.
+  snow_centers = tf.scatter_nd(indices, tf.ones([tf.shape(indices)[0]]),
+                               [num_batch, height, width])
+  snow_mask = tf.nn.conv2d(tf.expand_dims(snow_centers, 3),
+                           snowball[:, :, None, None],
+                           strides=4*[1], padding='SAME')
+  # overlapping snow balls add up in scatter_nd and conv2d
+  snow_mask = tf.minimum(snow_mask, 1.)
+
+  # snow is white, the maximum pixel value in [-1, 1]
+  return tf.maximum(image, 2.*snow_mask - 1.)
 
 
 def get_mr_image(image, boxes):
@@ -249,65 +307,63 @@ def get_mr_image(image, boxes):
   width = image_shape[2]
 
   # randomly select subsample factor to be 2 or 4
-  subsample = tf.floor(tf.random_uniform([], 0, 2))
-  down_height, down_width = tf.cond(tf.equal(subsample, 1),
-                              lambda: (tf.to_int32(height/2), tf.to_int32(width/2)),
-                              lambda: (tf.to_int32(height/4), tf.to_int32(width/4)))
+  subsample = 2 * tf.random_uniform([], 1, 3, dtype=tf.int32)
   downsampled_image = tf.image.resize_images(image,
-                                        [down_height, down_width])
+                                        [height // subsample, width // subsample])
 
   # randomly select resize methods
-  resize_method = tf.to_int32(tf.floor(tf.random_uniform([], 0, 4)))
-
-  upsampled_image0 = tf.image.resize_images(downsampled_image,
-                                           [height, width], method=0)
-  upsampled_image1 = tf.image.resize_images(downsampled_image,
-                                           [height, width], method=1)
-  upsampled_image2 = tf.image.resize_images(downsampled_image,
-                                           [height, width], method=2)
-  upsampled_image3 = tf.image.resize_images(downsampled_image,
-                                           [height, width], method=3)
-  upsampled_image = tf.case({tf.equal(resize_method, 0): lambda: upsampled_image0,
-                             tf.equal(resize_method, 1): lambda: upsampled_image1,
-                             tf.equal(resize_method, 2): lambda: upsampled_image2,
-                            }, default=lambda: upsampled_image3)
+  resize_method = tf.random_uniform([], 0, 4, dtype=tf.int32)
+
+  # build each resize inside its branch so that only the selected method runs.
+  # tf.switch_case is not available in TF1, but tf.case only executes the ops
+  # created inside the chosen branch function.
+  def upsample_fn(method):
+    return lambda: tf.image.resize_images(downsampled_image,
+                                          [height, width], method=method)
+  upsampled_image = tf.case([(tf.equal(resize_method, 0), upsample_fn(0)),
+                             (tf.equal(resize_method, 1), upsample_fn(1)),
+                             (tf.equal(resize_method, 2), upsample_fn(2)),
+                            ], default=upsample_fn(3))
   return upsampled_image
 
 
 def add_noise(images):
-  """Creates loss function for a DetectionModel.
+  """Adds noise to a list of images with a single batched op per noise type.
+
+  This is called from the tf.data map stage, so it must not create summaries.
 
   Args:
-    images: list of image tensors.
-    FLAGS: tf.app.flags.FLAGS
+    images: list of image tensors of shape [1, height, width, 3] sharing the
+      same height and width.
+
+  Returns:
+    noisy_images: list of noisy image tensors of shape [1, height, width, 3].
   """
-  # After model's preprocess is done,
-  # we double the size of the input mini batch for similarity learning
-  print('doubling input mini batch')
-  noisy_images = images
+  # list of tensors --> tensors, so that each noise op is built once per batch
+  noisy_images = tf.concat(images, 0)
   if FLAGS.salt_pepper_noise:
-    noisy_images = [get_salt_pepper_noise_image(image, ratio=FLAGS.ratio, rand_ratio=True)
-                    for image in noisy_images]
-    tf.summary.image('salt_pepper_noise_images', noisy_images[0])
+    noisy_images = get_salt_pepper_noise_image(noisy_images, ratio=FLAGS.ratio,
+                                               rand_ratio=True)
   if FLAGS.gaussian_noise:
-    noisy_images = [get_gaussian_noise_image(image, FLAGS.stddev, rand_stddev=False)
-                    for image in noisy_images]
-    tf.summary.image('gaussian_noise_images', noisy_images[0])
+    noisy_images = get_gaussian_noise_image(noisy_images, FLAGS.stddev,
+                                            rand_stddev=False)
   if FLAGS.lowres:
-    noisy_images = [get_mr_image(image, boxes) for (image, boxes)
-                   in zip(noisy_images, groundtruth_boxes_list)]
-    tf.summary.image('mixed_resolution_images', noisy_images[0])
+    noisy_images = get_mr_image(noisy_images, None)
   if FLAGS.snow:
-    noisy_images = [get_snow_image(image) for image
-                   in noisy_images]
-    tf.summary.image('snow_images', noisy_images[0])
+    noisy_images = get_snow_image(noisy_images)
 
-  return noisy_images
+  # tensors --> list of tensors
+  return tf.split(noisy_images, len(images), axis=0)
 
 def gated_denoise(images, is_training):
   # Discriminator Network
   # We are just mixing the two images
   images_shape = images.get_shape().as_list()
+  # XLA compiles a kernel for every input shape it sees. Without --resize the
+  # image size changes from step to step, so the clusters would be recompiled
+  # instead of reused; only compile them when the shape is fixed.
+  static_shape_jit_scope = functools.partial(
+      jit_scope, compile_ops=None not in images_shape)
   num_batch = FLAGS.batch_size
   noisy_batch_size = FLAGS.lowres_batch_size if (FLAGS.lowres or FLAGS.noise) else 0
   losses_dict = {}
@@ -335,16 +391,25 @@ def gated_denoise(images, is_training):
     summaries_dict['filtered_noisy_images'] = tf.summary.image('filtered_noisy_images', filtered_images, max_outputs=1)
     summaries_dict['filtered_clean_images'] = tf.summary.image('filtered_clean_images', filtered_images[noisy_batch_size:], max_outputs=1)
   elif FLAGS.denoise:
-    with tf.variable_scope('denoise') as scope:
-      denoised_images = generator_resnet(images, options, reuse=False, name='generator') 
+    custom_getter = (
+        half_precision.float32_variable_storage_getter(FLAGS.loss_scale)
+        if FLAGS.half_precision_denoise else None)
+    with tf.variable_scope('denoise', custom_getter=custom_getter) as scope:
+      if FLAGS.half_precision_denoise:
+        # the generator runs in float16 while the losses stay in float32.
+        denoised_images = half_precision.half_precision_generator(
+            generator_resnet, images, options, name='generator',
+            loss_scale=FLAGS.loss_scale)
+      else:
+        denoised_images = generator_resnet(images, options, name='generator') 
       denoise_sim_loss = abs_criterion(denoised_images[:noisy_batch_size], original_images, name='g_loss/sim_loss')
       losses_dict['g_loss'] = denoise_sim_loss
       summaries_dict['g_loss/sim_loss'] = tf.summary.scalar('g_loss/sim_loss', denoise_sim_loss)
       if FLAGS.denoise_discrim:
         noisy_and_denoised = tf.concat([noisy_images, denoised_images[:noisy_batch_size]], 3)
         noisy_and_original = tf.concat([noisy_images, original_images], 3)
-        d_denoised = discriminator(noisy_and_denoised, options, reuse=False, name='discriminator')
-        d_original = discriminator(noisy_and_original, options, reuse=True,  name='discriminator')
+        d_denoised = discriminator(noisy_and_denoised, options, name='discriminator')
+        d_original = discriminator(noisy_and_original, options, name='discriminator')
 
         # generator loss
         g_loss = FLAGS.denoise_loss_factor * denoise_sim_loss + \
@@ -371,7 +436,7 @@ def gated_denoise(images, is_training):
   # Gate Operation
   if FLAGS.discrim:
     with tf.variable_scope('input_discrim') as scope:
-      d_in_logits = discriminator(images, options, reuse=False, name='discriminator')
+      d_in_logits = discriminator(images, options, name='discriminator')
 
       d_in_loss_real = criterionGAN2(d_in_logits[noisy_batch_size:],  tf.ones_like(d_in_logits[noisy_batch_size:]))
       d_in_loss_fake = criterionGAN2(d_in_logits[:noisy_batch_size], tf.zeros_like(d_in_logits[:noisy_batch_size]))
@@ -381,11 +446,16 @@ def gated_denoise(images, is_training):
       summaries_dict['d_in_loss'] = tf.summary.scalar('d_in_loss', d_in_loss)
       #tf.add_to_collection('losses', losses_dict['d_in_loss'])
   
-      d_in_logits = tf.reduce_mean(d_in_logits, [1, 2, 3])
-      d_in_sigmoid = tf.nn.sigmoid(d_in_logits, name='is_clean')
+      # the gate blend streams two image sized tensors, so let XLA fuse the
+      # reduction, sigmoid and blend into a single kernel. Summaries cannot be
+      # compiled and stay outside the jit scope.
+      with static_shape_jit_scope():
+        d_in_logits = tf.reduce_mean(d_in_logits, [1, 2, 3])
+        d_in_sigmoid = tf.nn.sigmoid(d_in_logits, name='is_clean')
+        # lerp: alpha*images + (1 - alpha)*filtered_images
+        alpha = d_in_sigmoid[:,None,None,None]
+        images = filtered_images + alpha * (images - filtered_images)
       activation_summary(d_in_sigmoid)
-      images =  tf.add(d_in_sigmoid[:,None,None,None] * images,
-                       (1 - d_in_sigmoid[:,None,None,None]) * filtered_images)
   else:
     images = filtered_images
 
@@ -394,6 +464,15 @@ def gated_denoise(images, is_training):
 
   return images, losses_dict, summaries_dict
 
+def inception_preprocess(images):
+  """ [0, 255] --> [-1, 1]
+  """
+  return (2.0 / 255.0) * images - 1.0
+
+def inception_depreprocess(images):
+  """ [-1, 1] --> [0, 255]
+  """
+  return (255.0 / 2.0) * (images + 1.0)
 
 def _create_losses(input_queue, create_model_fn, train_config):
   """Creates loss function for a DetectionModel.
@@ -405,11 +484,31 @@ def _create_losses(input_queue, create_model_fn, train_config):
   """
   detection_model = create_model_fn()
   (images, _, groundtruth_boxes_list, groundtruth_classes_list,
-   groundtruth_masks_list, groundtruth_keypoints_list) = get_inputs(
+   groundtruth_masks_list, groundtruth_keypoints_list, noisy_images) = get_inputs(
        input_queue,
        detection_model.num_classes,
        train_config.merge_multiple_label_boxes)
-  images = [detection_model.preprocess(image) for image in images]
+  add_noisy_images = (FLAGS.lowres or FLAGS.snow or FLAGS.gaussian_noise or
+                      FLAGS.salt_pepper_noise)
+  if add_noisy_images:
+    # noise has been added in the input pipeline (see create_input_queue).
+    # a noisy image has the size of its clean image, so each pair is
+    # preprocessed (and resized) as a single batch. The pairs have different
+    # sizes and cannot be stacked, but their preprocess subgraphs do not
+    # depend on each other, so the executor already runs them concurrently.
+    pairs = [detection_model.preprocess(tf.concat([noisy_image, image], 0))
+             for noisy_image, image in zip(noisy_images, images)]
+    # make sure to match the size of the images for denoise filter training
+    # resize the images only when training denoise network.
+    if FLAGS.resize:
+      down_height = 600
+      down_width = 600
+      pairs = [tf.image.resize_images(pair, [down_height, down_width])
+               for pair in pairs]
+    noisy_images = [pair[:1] for pair in pairs]
+    images = [pair[1:] for pair in pairs]
+  else:
+    images = [detection_model.preprocess(image) for image in images]
 
   # lowresolution injection
   tf.summary.image('model_preprocessed_images', images[0])
@@ -420,22 +519,17 @@ def _create_losses(input_queue, create_model_fn, train_config):
                         tf.expand_dims(groundtruth_boxes_list[0], 0))
   tf.summary.image('image_with_bounding_boxes', image_with_box)
 
-  if FLAGS.lowres or FLAGS.snow or FLAGS.gaussian_noise or FLAGS.salt_pepper_noise:
-    # add noise
-    noisy_images = add_noise(images)
+  if add_noisy_images:
+    # we double the size of the input mini batch for similarity learning
+    print('doubling input mini batch')
+    tf.summary.image('noisy_images', noisy_images[0])
     images = noisy_images + images
-    groundtruth_boxes_list += groundtruth_boxes_list
-    groundtruth_classes_list += groundtruth_classes_list
-    groundtruth_masks_list += groundtruth_masks_list
-
-    # make sure to match the size of the images for denoise filter training
-    # resize the images only when training denoise network.
-    if FLAGS.resize:
-      down_height = 600
-      down_width = 600
-      images = [tf.image.resize_images(image,
-                [down_height, down_width])
-                for image in images]
+    # groundtruth tensors have a different number of boxes per image, so they
+    # stay per image lists; repeating the lists only copies tensor references.
+    groundtruth_boxes_list *= 2
+    groundtruth_classes_list *= 2
+    groundtruth_masks_list *= 2
+    groundtruth_keypoints_list *= 2
 
   # list of tensors --> tensors
   images = tf.concat(images, 0)
@@ -513,12 +607,20 @@ def train(create_tensor_dict_fn, create_model_fn, train_config, master, task,
     with tf.device(deploy_config.variables_device()):
       global_step = slim.create_global_step()
 
+    # Stage the inputs directly in GPU memory when a single GPU clone consumes
+    # them. With several clones the elements are shared, so they stay on the
+    # input device.
+    prefetch_device = None
+    if num_clones == 1 and not clone_on_cpu:
+      prefetch_device = deploy_config.clone_device(0)
+
     with tf.device(deploy_config.inputs_device()):
       input_queue = create_input_queue(
           train_config.batch_size // num_clones, create_tensor_dict_fn,
           train_config.batch_queue_capacity,
           train_config.num_batch_queue_threads,
-          train_config.prefetch_queue_capacity, data_augmentation_options)
+          train_config.prefetch_queue_capacity, data_augmentation_options,
+          prefetch_device=prefetch_device)
 
     # Gather initial summaries.
     # TODO(rathodv): See if summaries can be added/extracted from global tf
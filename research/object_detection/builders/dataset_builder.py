@@ -0,0 +1,124 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""tf.data.Dataset builder.
+
+Creates a tf.data.Dataset of decoded tensor dictionaries from an InputReader
+config. This is the tf.data counterpart of input_reader_builder: the records
+are read and decoded by the tf.data runtime instead of queue runners, so the
+input pipeline can overlap with the model on the training device. See
+input_reader.proto for options.
+"""
+
+import tensorflow as tf
+
+from object_detection.data_decoders import tf_example_decoder
+from object_detection.protos import input_reader_pb2
+
+
+def build(input_reader_config, num_parallel_calls=8,
+          transform_input_data_fn=None, cache_filename=None):
+  """Builds a tf.data.Dataset based on the InputReader config.
+
+  Args:
+    input_reader_config: A input_reader_pb2.InputReader object.
+    num_parallel_calls: number of records to decode in parallel.
+    transform_input_data_fn: optional function that maps a decoded tensor dict
+      to a transformed tensor dict. It is applied in the same map stage as the
+      decoder, so that each record goes through a single map function.
+    cache_filename: if not None, the decoded tensor dicts are cached after the
+      first epoch, in memory if cache_filename is '' and in files with this
+      prefix otherwise. transform_input_data_fn then runs in a separate map
+      stage after the cache, so random augmentations still differ per epoch.
+      With shuffle, the queue_capacity sized shuffle buffer then holds decoded
+      images instead of serialized records, roughly ten times the memory. A
+      file cache is only complete, and reused by later runs, after a full
+      pass over the dataset.
+
+  Returns:
+    A tf.data.Dataset of tensor dicts based on the input_reader_config. Each
+    element holds a single (unbatched) example.
+
+  Raises:
+    ValueError: On invalid input reader proto.
+    ValueError: If no input paths are specified.
+  """
+  if not isinstance(input_reader_config, input_reader_pb2.InputReader):
+    raise ValueError('input_reader_config not of type '
+                     'input_reader_pb2.InputReader.')
+
+  if input_reader_config.WhichOneof('input_reader') == 'tf_record_input_reader':
+    config = input_reader_config.tf_record_input_reader
+    if not config.input_path:
+      raise ValueError('At least one input path must be specified in '
+                       '`input_reader_config`.')
+    filenames = []
+    for input_path in config.input_path:
+      filenames.extend(tf.gfile.Glob(input_path))
+    if not filenames:
+      raise ValueError('No files match the input paths in '
+                       '`input_reader_config`.')
+
+    # read num_readers files in parallel. Without shuffling the records are
+    # read in a deterministic order, otherwise slow files are skipped over.
+    filenames_dataset = tf.data.Dataset.from_tensor_slices(filenames)
+    if input_reader_config.shuffle:
+      filenames_dataset = filenames_dataset.shuffle(len(filenames))
+    interleave_records = tf.contrib.data.parallel_interleave(
+        tf.data.TFRecordDataset,
+        cycle_length=input_reader_config.num_readers,
+        sloppy=input_reader_config.shuffle)
+
+    label_map_proto_file = None
+    if input_reader_config.HasField('label_map_path'):
+      label_map_proto_file = input_reader_config.label_map_path
+    decoder = tf_example_decoder.TfExampleDecoder(
+        load_instance_masks=input_reader_config.load_instance_masks,
+        label_map_proto_file=label_map_proto_file)
+
+    def repeat(dataset):
+      return dataset.repeat(
+          input_reader_config.num_epochs if input_reader_config.num_epochs
+          else None)
+
+    if cache_filename is not None:
+      # Decoding is deterministic, so it only needs to run in the first epoch.
+      # The cache replays the first epoch, so the records are shuffled after it.
+      dataset = filenames_dataset.apply(interleave_records).map(
+          decoder.decode, num_parallel_calls=num_parallel_calls)
+      dataset = dataset.cache(cache_filename)
+      if input_reader_config.shuffle:
+        dataset = dataset.shuffle(input_reader_config.queue_capacity)
+      dataset = repeat(dataset)
+      if transform_input_data_fn is not None:
+        dataset = dataset.map(transform_input_data_fn,
+                              num_parallel_calls=num_parallel_calls)
+      return dataset
+
+    def decode_fn(serialized_example):
+      tensor_dict = decoder.decode(serialized_example)
+      if transform_input_data_fn is not None:
+        tensor_dict = transform_input_data_fn(tensor_dict)
+      return tensor_dict
+
+    # the files are repeated before they are interleaved, so that their order
+    # is shuffled again in every epoch.
+    records_dataset = repeat(filenames_dataset).apply(interleave_records)
+    if input_reader_config.shuffle:
+      records_dataset = records_dataset.shuffle(
+          input_reader_config.queue_capacity)
+    return records_dataset.map(decode_fn, num_parallel_calls=num_parallel_calls)
+
+  raise ValueError('Unsupported input_reader_config.')
@@ -134,3 +134,52 @@ class BatchQueue(object):
       tensor_dict_list.append(tensor_dict)
 
     return tensor_dict_list
+
+
+class DatasetQueue(object):
+  """DatasetQueue class.
+
+  This class dequeues batches of tensor_dicts from a tf.data.Dataset and exposes
+  the same dequeue interface as BatchQueue, so that it can replace the queue
+  runner based pipeline without changing the consumers.
+
+  Example input pipeline with tf.data:
+  ------------------------------------
+  dataset = dataset_builder.build(input_reader_config,
+                                  transform_input_data_fn=preprocess_fn)
+  dataset = dataset.prefetch(64)
+  batch_queue = batcher.DatasetQueue(dataset, batch_size=2)
+  tensor_dict_list = batch_queue.dequeue()
+  outputs = Model(tensor_dict_list)
+  ...
+  -----------------------------------
+
+  Notes:
+  -----
+  Elements of the dataset are dequeued one at a time and returned as a list,
+  so tensors of unequal sizes (e.g. images) are neither padded nor unpadded.
+
+  The iterator initializer is added to the TABLE_INITIALIZERS collection so
+  that it runs along with the lookup table initializers of the decoder (e.g.
+  in the local init op of slim.learning.train).
+  """
+
+  def __init__(self, dataset, batch_size):
+    """Constructs a dataset queue holding tensor_dicts.
+
+    Args:
+      dataset: a tf.data.Dataset whose elements are tensor_dicts.
+      batch_size: batch size.
+    """
+    self._iterator = dataset.make_initializable_iterator()
+    tf.add_to_collection(tf.GraphKeys.TABLE_INITIALIZERS,
+                         self._iterator.initializer)
+    self._batch_size = batch_size
+
+  def dequeue(self):
+    """Dequeues a batch of tensor_dict from the DatasetQueue.
+
+    Returns:
+      A list of tensor_dicts of the requested batch_size.
+    """
+    return [self._iterator.get_next() for _ in range(self._batch_size)]
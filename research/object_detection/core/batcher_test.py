@@ -154,5 +154,39 @@ class BatcherTest(tf.test.TestCase):
           sess.run(batch)
 
 
+  def test_dataset_queue_dequeues_tensors_of_different_sizes(self):
+    with self.test_session() as sess:
+      batch_size = 3
+      num_batches = 2
+      def make_tensor_dict(counter):
+        counter = tf.to_int32(counter)
+        boxes = tf.tile(
+            tf.reshape(tf.range(4), [1, 4]), tf.stack([counter, tf.constant(1)]))
+        return {'boxes': boxes}
+      dataset = tf.data.Dataset.range(
+          2, num_batches * batch_size + 2).map(make_tensor_dict)
+      batch_queue = batcher.DatasetQueue(dataset, batch_size=batch_size)
+      batch = batch_queue.dequeue()
+
+      for tensor_dict in batch:
+        for tensor in tensor_dict.values():
+          self.assertAllEqual([None, 4], tensor.get_shape().as_list())
+
+      sess.run(tf.tables_initializer())
+      # Elements within a batch are dequeued by independent ops, so only the
+      # set of sizes in each batch is deterministic.
+      i = 2
+      for _ in range(num_batches):
+        batch_np = sess.run(batch)
+        sizes = sorted(tensor_dict['boxes'].shape[0] for tensor_dict in batch_np)
+        self.assertAllEqual(sizes, list(range(i, i + batch_size)))
+        for tensor_dict in batch_np:
+          boxes = tensor_dict['boxes']
+          self.assertAllEqual(boxes, np.tile(np.arange(4), (boxes.shape[0], 1)))
+        i += batch_size
+      with self.assertRaises(tf.errors.OutOfRangeError):
+        sess.run(batch)
+
+
 if __name__ == '__main__':
   tf.test.main()
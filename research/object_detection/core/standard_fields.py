@@ -35,6 +35,7 @@ class InputDataFields(object):
   Attributes:
     image: image.
     original_image: image in the original input size.
+    noisy_image: image with synthetic noise or distortion applied.
     key: unique key corresponding to image.
     source_id: source of the original image.
     filename: original filename of the dataset (without common path).
@@ -60,6 +61,7 @@ class InputDataFields(object):
   """
   image = 'image'
   original_image = 'original_image'
+  noisy_image = 'noisy_image'
   key = 'key'
   source_id = 'source_id'
   filename = 'filename'
@@ -69,15 +69,12 @@ def gated_denoise(images, FLAGS, is_training=False, noisy_batch_size=1):
     if FLAGS.mixture_of_filters:
       with tf.variable_scope('filter_gate') as scope:
         print('Building mixture of filters model')
-        filtered_images0 = average_filter(images, 2)
-        filtered_images1 = average_filter(images, 3)
-        filtered_images2 = average_filter(images, 4)
-        probs = gate(images, FLAGS.ndf, num_classes=4, reuse=False, name='gate')
+        probs = gate(images, FLAGS.ndf, num_classes=4, name='gate')
         activation_summary(probs)
-        filtered_images = tf.add_n([probs[:,0,None,None,None]*images,
-                                    probs[:,1,None,None,None]*filtered_images0,
-                                    probs[:,2,None,None,None]*filtered_images1,
-                                    probs[:,3,None,None,None]*filtered_images2])
+        # the identity and the 2x2, 3x3 and 4x4 average filters are computed
+        # by one depthwise convolution and mixed in a single weighted sum.
+        filtered_images = mixture_of_average_filters(images, probs,
+                                                     filter_sizes=(1, 2, 3, 4))
     else:
       filtered_images = average_filter(images, FLAGS.filter_size)
     summaries_dict['filtered_noisy_images'] = tf.summary.image('filtered_noisy_images', filtered_images, max_outputs=1)
@@ -88,9 +85,9 @@ def gated_denoise(images, FLAGS, is_training=False, noisy_batch_size=1):
     print('denoise is applied')
     with tf.variable_scope('denoise') as scope:
       if FLAGS.generator_separate_channel:
-        denoised_images = generator_separate_resnet(filtered_images, options, res_depth=FLAGS.res_depth, reuse=False, name='generator') 
+        denoised_images = generator_separate_resnet(filtered_images, options, res_depth=FLAGS.res_depth, name='generator') 
       else:
-        denoised_images = generator_resnet(filtered_images, options, res_depth=FLAGS.res_depth, output_c_dim=3, reuse=False, name='generator') 
+        denoised_images = generator_resnet(filtered_images, options, res_depth=FLAGS.res_depth, output_c_dim=3, name='generator') 
       if is_training:
         denoise_sim_loss = abs_criterion(denoised_images[:noisy_batch_size], original_images, name='g_loss/sim_loss')
         g_loss = FLAGS.denoise_loss_factor * denoise_sim_loss
@@ -98,10 +95,10 @@ def gated_denoise(images, FLAGS, is_training=False, noisy_batch_size=1):
         summaries_dict['g_loss/sim_loss'] = tf.summary.scalar('g_loss/sim_loss', denoise_sim_loss)
       if FLAGS.denoise_discrim:
         noisy_and_denoised = tf.concat([noisy_images, denoised_images], 3)
-        d_denoised = discriminator(noisy_and_denoised, FLAGS.ndf, reuse=False, name='discriminator')
+        d_denoised = discriminator(noisy_and_denoised, FLAGS.ndf, name='discriminator')
         if is_training:
           noisy_and_original = tf.concat([noisy_images, original_images], 3)
-          d_original = discriminator(noisy_and_original, FLAGS.ndf, reuse=True,  name='discriminator')
+          d_original = discriminator(noisy_and_original, FLAGS.ndf, name='discriminator')
 
           # generator loss
           g_gan_loss = criterionGAN(d_denoised, tf.ones_like(d_denoised))
@@ -131,7 +128,7 @@ def gated_denoise(images, FLAGS, is_training=False, noisy_batch_size=1):
   if FLAGS.discrim:
     print('gate network is applied')
     with tf.variable_scope('input_discrim') as scope:
-      d_in_logits = discriminator(images, FLAGS.ndf, reuse=False, name='discriminator')
+      d_in_logits = discriminator(images, FLAGS.ndf, name='discriminator')
 
       if is_training:
         d_in_loss_real = criterionGAN2(d_in_logits[noisy_batch_size:],  tf.ones_like(d_in_logits[noisy_batch_size:]))
@@ -47,7 +47,7 @@ import os
 import tensorflow as tf
 
 from object_detection import denoise_discrim_trainer
-from object_detection.builders import input_reader_builder
+from object_detection.builders import dataset_builder
 from object_detection.builders import model_builder
 from object_detection.utils import config_util
 
@@ -68,6 +68,10 @@ flags.DEFINE_integer('ps_tasks', 0,
                      'a parameter server.')
 flags.DEFINE_string('train_dir', '',
                     'Directory to save the checkpoints and training summaries.')
+flags.DEFINE_boolean('xla_auto_jit', False,
+                     'True for XLA auto-clustering of the training graph. '
+                     'Works best with --resize, since XLA recompiles for '
+                     'every new image size.')
 
 flags.DEFINE_string('pipeline_config_path', '',
                     'Path to a pipeline_pb2.TrainEvalPipelineConfig config '
@@ -79,6 +83,9 @@ flags.DEFINE_string('input_config_path', '',
                     'Path to an input_reader_pb2.InputReader config file.')
 flags.DEFINE_string('model_config_path', '',
                     'Path to a model_pb2.DetectionModel config file.')
+flags.DEFINE_string('input_cache_path', None,
+                    'Caches the decoded training examples, in memory if '
+                    'empty. See dataset_builder.build.')
 
 flags.DEFINE_boolean('generator_separate_channel', False,
                     'True for channel wise learning.')
@@ -138,6 +145,10 @@ flags.DEFINE_boolean('gaussian_noise', False,
                      'True for original + gaussian noise training.')
 flags.DEFINE_boolean('snow', False,
                      'True for original + snow effect training.')
+flags.DEFINE_boolean('half_precision_denoise', False,
+                     'True for running the denoise generator in float16.')
+flags.DEFINE_float('loss_scale', 128.,
+                   'loss scale for the float16 denoise generator gradients')
 
 FLAGS = flags.FLAGS
 
@@ -174,7 +185,8 @@ def main(_):
       is_training=True)
 
   create_input_dict_fn = functools.partial(
-      input_reader_builder.build, input_config)
+      dataset_builder.build, input_config,
+      cache_filename=FLAGS.input_cache_path)
 
   env = json.loads(os.environ.get('TF_CONFIG', '{}'))
   cluster_data = env.get('cluster', None)
@@ -23,6 +23,7 @@ import functools
 
 import tensorflow as tf
 
+from object_detection import half_precision
 from object_detection.builders import optimizer_builder
 from object_detection.builders import preprocessor_builder
 from object_detection.core import batcher
@@ -43,6 +44,13 @@ slim = tf.contrib.slim
 flags = tf.app.flags
 FLAGS = flags.FLAGS
 
+jit_scope = tf.contrib.compiler.jit.experimental_jit_scope
+
+OPTIONS = namedtuple('OPTIONS', 'gf_dim df_dim output_c_dim is_training')
+# mae_criterion broadcasts, so its real/fake targets are passed as scalars
+criterionGAN = mae_criterion
+criterionGAN2 = sce_criterion
+
 def activation_summary(x):
   """Helper to create summaries for activations.
 
@@ -64,67 +72,78 @@ def activation_summary(x):
 def optimistic_restore(session, save_file):
   reader = tf.train.NewCheckpointReader(save_file)
   saved_shapes = reader.get_variable_to_shape_map()
-  var_names = sorted([(var.name, var.name.split(':')[0]) for var in tf.global_variables()
-                  if var.name.split(':')[0] in saved_shapes])
-  restore_vars = []
-  name2var = dict(zip(map(lambda x:x.name.split(':')[0], tf.global_variables()), tf.global_variables()))
-  with tf.variable_scope('', reuse=True):
-    for var_name, saved_var_name in var_names:
-      curr_var = name2var[saved_var_name]
-      var_shape = curr_var.get_shape().as_list()
-      if var_shape == saved_shapes[saved_var_name]:
-        restore_vars.append(curr_var)
+  name2var = {var.name.split(':')[0]: var for var in tf.global_variables()}
+  restore_vars = [var for name, var in name2var.items()
+                  if name in saved_shapes and
+                  var.get_shape().as_list() == saved_shapes[name]]
   saver = tf.train.Saver(restore_vars)
   saver.restore(session, save_file)
 
 
 def create_input_queue(batch_size_per_clone, create_tensor_dict_fn,
                        batch_queue_capacity, num_batch_queue_threads,
-                       prefetch_queue_capacity, data_augmentation_options):
-  """Sets up reader, prefetcher and returns input queue.
+                       prefetch_queue_capacity, data_augmentation_options,
+                       prefetch_device=None):
+  """Sets up a tf.data input pipeline and returns input queue.
 
   Args:
     batch_size_per_clone: batch size to use per clone.
-    create_tensor_dict_fn: function to create tensor dictionary.
-    batch_queue_capacity: maximum number of elements to store within a queue.
-    num_batch_queue_threads: number of threads to use for batching.
-    prefetch_queue_capacity: maximum capacity of the queue used to prefetch
-                             assembled batches.
+    create_tensor_dict_fn: function like dataset_builder.build to create a
+      tf.data.Dataset of tensor dictionaries; the preprocessing function is
+      passed to it as transform_input_data_fn.
+    batch_queue_capacity: maximum number of elements to prefetch.
+    num_batch_queue_threads: number of elements to preprocess in parallel.
+    prefetch_queue_capacity: maximum number of elements to stage on
+      prefetch_device.
     data_augmentation_options: a list of tuples, where each tuple contains a
       data augmentation function and a dictionary containing arguments and their
       values (see preprocessor.py).
+    prefetch_device: optional device to stage the preprocessed tensor_dicts
+      on, e.g. the GPU of the clone consuming them. String fields cannot be
+      copied to GPU memory and are dropped then, so the image keys are empty.
+      If None, the tensor_dicts stay on the input device until they are
+      dequeued.
 
   Returns:
-    input queue: a batcher.BatchQueue object holding enqueued tensor_dicts
+    input queue: a batcher.DatasetQueue object holding tensor_dicts
       (which hold images, boxes and targets).  To get a batch of tensor_dicts,
-      call input_queue.Dequeue().
+      call input_queue.dequeue().
   """
-  tensor_dict = create_tensor_dict_fn()
-
-  tensor_dict[fields.InputDataFields.image] = tf.expand_dims(
-      tensor_dict[fields.InputDataFields.image], 0)
-
-  images = tensor_dict[fields.InputDataFields.image]
-  float_images = tf.to_float(images)
-  tensor_dict[fields.InputDataFields.image] = float_images
-
-  include_instance_masks = (fields.InputDataFields.groundtruth_instance_masks
-                            in tensor_dict)
-  include_keypoints = (fields.InputDataFields.groundtruth_keypoints
-                       in tensor_dict)
-  if data_augmentation_options:
-    tensor_dict = preprocessor.preprocess(
-        tensor_dict, data_augmentation_options,
-        func_arg_map=preprocessor.get_default_func_arg_map(
-            include_instance_masks=include_instance_masks,
-            include_keypoints=include_keypoints))
-
-  input_queue = batcher.BatchQueue(
-      tensor_dict,
-      batch_size=batch_size_per_clone,
-      batch_queue_capacity=batch_queue_capacity,
-      num_batch_queue_threads=num_batch_queue_threads,
-      prefetch_queue_capacity=prefetch_queue_capacity)
+  def preprocess_fn(tensor_dict):
+    """Preprocesses a single tensor_dict."""
+    tensor_dict[fields.InputDataFields.image] = tf.expand_dims(
+        tensor_dict[fields.InputDataFields.image], 0)
+
+    images = tensor_dict[fields.InputDataFields.image]
+    float_images = tf.to_float(images)
+    tensor_dict[fields.InputDataFields.image] = float_images
+
+    include_instance_masks = (fields.InputDataFields.groundtruth_instance_masks
+                              in tensor_dict)
+    include_keypoints = (fields.InputDataFields.groundtruth_keypoints
+                         in tensor_dict)
+    if data_augmentation_options:
+      tensor_dict = preprocessor.preprocess(
+          tensor_dict, data_augmentation_options,
+          func_arg_map=preprocessor.get_default_func_arg_map(
+              include_instance_masks=include_instance_masks,
+              include_keypoints=include_keypoints))
+    if prefetch_device:
+      # string fields, e.g. source_id and filename, stay on the host.
+      tensor_dict = {key: value for key, value in tensor_dict.items()
+                     if value.dtype != tf.string}
+    return tensor_dict
+
+  dataset = create_tensor_dict_fn(
+      num_parallel_calls=num_batch_queue_threads,
+      transform_input_data_fn=preprocess_fn)
+  dataset = dataset.prefetch(batch_queue_capacity)
+  if prefetch_device:
+    # must be the last transformation of the input pipeline
+    dataset = dataset.apply(tf.contrib.data.prefetch_to_device(
+        prefetch_device, buffer_size=prefetch_queue_capacity))
+
+  input_queue = batcher.DatasetQueue(dataset, batch_size=batch_size_per_clone)
   return input_queue
 
 
@@ -132,7 +151,7 @@ def get_inputs(input_queue, num_classes, merge_multiple_label_boxes=False):
   """Dequeues batch and constructs inputs to object detection model.
 
   Args:
-    input_queue: BatchQueue object holding enqueued tensor_dicts.
+    input_queue: DatasetQueue object holding tensor_dicts.
     num_classes: Number of classes.
     merge_multiple_label_boxes: Whether to merge boxes with multiple labels
       or not. Defaults to false. Merged boxes are represented with a single
@@ -186,20 +205,17 @@ def get_salt_pepper_noise_image(image, ratio=0.01, rand_ratio=False):
   height = image_shape[1]
   width = image_shape[2]
 
-  # uniform [1 - ratio, 2 - ratio)
-  ratio = tf.random_uniform([], maxval=ratio) if rand_ratio else ratio
-  random_tensor = 1. - ratio
-  random_tensor += tf.random_uniform(image_shape)
-  # 0: ratio, 1: 1 - ratio
-  binary_tensor = tf.floor(random_tensor)
-
-  # scale image from [-1, 1] to [0, 1]
-  random_tensor2 = tf.random_uniform(image_shape)
-  image = (image + 1.)/2.
-  noise_image = binary_tensor*image + (1.-binary_tensor)*random_tensor2
-
-  # scaling pixel values to be in [-1, 1]).
-  noise_image = tf.clip_by_value(noise_image*2.-1, -1, 1)
+  # the noise is generated on the device of the image, and XLA fuses its
+  # generation with the select, so the noise tensors are never written out.
+  # The noise is added before --resize, so only compile for a fixed shape.
+  with jit_scope(compile_ops=image.get_shape().is_fully_defined()):
+    ratio = tf.random_uniform([], maxval=ratio) if rand_ratio else ratio
+    # False: ratio, True: 1 - ratio
+    keep_mask = tf.random_uniform(image_shape) >= ratio
+
+    # noise pixels are drawn directly in [-1, 1], the range of the image.
+    random_tensor2 = tf.random_uniform(image_shape, minval=-1., maxval=1.)
+    noise_image = tf.where(keep_mask, image, random_tensor2)
   return noise_image
 
 def get_gaussian_noise_image(image, stddev=0.15, rand_stddev=False):
@@ -210,13 +226,15 @@ def get_gaussian_noise_image(image, stddev=0.15, rand_stddev=False):
   width = image_shape[2]
   
   if rand_stddev:
-    sigma = tf.abs(tf.truncated_normal([num_batch], mean=0., stddev=stddev/2))
+    sigma = tf.abs(tf.truncated_normal([num_batch, 1, 1, 1], mean=0.,
+                                       stddev=stddev/2))
   else:
     sigma = stddev
-  # since preprocessed input values are in [-1, 1], we use sigma*2
-  noise = tf.random_normal(image_shape, mean=0., stddev=sigma*2)
-  # scaling pixel values to be in [-1, 1]).
-  noise_image = tf.clip_by_value(image + noise, -1, 1)
+  with jit_scope(compile_ops=image.get_shape().is_fully_defined()):
+    # since preprocessed input values are in [-1, 1], we use sigma*2
+    noise = tf.random_normal(image_shape) * (sigma*2)
+    # scaling pixel values to be in [-1, 1]).
+    noise_image = tf.clip_by_value(image + noise, -1, 1)
   return noise_image
 
 def get_snow_image(image, sparsity=0.05):
@@ -312,72 +330,87 @@ def add_noise(images,
 
   return noisy_images
 
-def gated_denoise(images, is_training, train_config):
+def gated_denoise(images, is_training, train_config, add_summaries=True):
   # Discriminator Network
   # We are just mixing the two images
   images_shape = images.get_shape().as_list()
+  # XLA compiles a kernel for every input shape it sees. Without --resize the
+  # image size changes from step to step, so the clusters would be recompiled
+  # instead of reused; only compile them when the shape is fixed.
+  static_shape_jit_scope = functools.partial(
+      jit_scope, compile_ops=None not in images_shape)
   noisy_batch_size = train_config.batch_size if (FLAGS.lowres or FLAGS.gaussian_noise) else 0
   losses_dict = {}
   summaries_dict = {}
 
-  OPTIONS = namedtuple('OPTIONS', 'gf_dim df_dim output_c_dim is_training')
   options = OPTIONS._make((FLAGS.ngf, FLAGS.ndf, 3, is_training))
-  criterionGAN = mae_criterion
-  criterionGAN2 = sce_criterion
   
   noisy_images = images[:noisy_batch_size]
   original_images = images[noisy_batch_size:]
 
   # Filter
-  summaries_dict['prefiltered_noisy_images'] = tf.summary.image('prefiltered_noisy_images', images, max_outputs=1)
-  summaries_dict['prefiltered_clean_images'] = tf.summary.image('prefiltered_clean_images', images[noisy_batch_size:], max_outputs=1)
+  # image summaries run on the CPU, so only the displayed image is sliced out
+  # on the device and copied to the host instead of the whole batch.
+  def add_image_summary(name, image):
+    # replicas that do not write summaries skip the image copies entirely.
+    if add_summaries:
+      summaries_dict[name] = tf.summary.image(name, image, max_outputs=1)
+
+  add_image_summary('prefiltered_noisy_images', images[:1])
+  add_image_summary('prefiltered_clean_images', images[noisy_batch_size:noisy_batch_size+1])
   filtered_images = images
   if FLAGS.average_filter:
     if FLAGS.mixture_of_filters:
       with tf.variable_scope('filter_gate') as scope:
         print('Building mixture of filters model')
-        filtered_images0 = average_filter(images, 2)
-        filtered_images1 = average_filter(images, 3)
-        filtered_images2 = average_filter(images, 4)
-        probs = gate(images, FLAGS.ndf, num_classes=4, reuse=False, name='gate')
+        probs = gate(images, FLAGS.ndf, num_classes=4, name='gate')
         activation_summary(probs)
-        filtered_images = tf.add_n([probs[:,0,None,None,None]*images,
-                                    probs[:,1,None,None,None]*filtered_images0,
-                                    probs[:,2,None,None,None]*filtered_images1,
-                                    probs[:,3,None,None,None]*filtered_images2])
+        # the identity and the 2x2, 3x3 and 4x4 average filters are computed
+        # by one depthwise convolution, and XLA fuses the weighted sum.
+        with static_shape_jit_scope():
+          filtered_images = mixture_of_average_filters(images, probs,
+                                                       filter_sizes=(1, 2, 3, 4))
     else:
       filtered_images = average_filter(images, FLAGS.filter_size)
-    summaries_dict['filtered_noisy_images'] = tf.summary.image('filtered_noisy_images', filtered_images, max_outputs=1)
-    summaries_dict['filtered_clean_images'] = tf.summary.image('filtered_clean_images', filtered_images[noisy_batch_size:], max_outputs=1)
+    add_image_summary('filtered_noisy_images', filtered_images[:1])
+    add_image_summary('filtered_clean_images', filtered_images[noisy_batch_size:noisy_batch_size+1])
 
   if FLAGS.srcnn:
-    with tf.variable_scope('srcnn') as scope:
-      if FLAGS.generator_separate_channel:
-        denoised_images = generator_separate_resnet(images, options, res_depth=FLAGS.res_depth, reuse=False, name='generator') 
-      else:
-        denoised_images = generator_resnet(images, options, res_depth=FLAGS.res_depth, output_c_dim=3, reuse=False, name='generator') 
+    # with half_precision_denoise the generator runs in float16 on float32
+    # master weights, while the losses below stay in float32.
+    custom_getter = (
+        half_precision.float32_variable_storage_getter(FLAGS.loss_scale)
+        if FLAGS.half_precision_denoise else None)
+    with tf.variable_scope('srcnn', custom_getter=custom_getter) as scope:
+      generator_fn = (generator_separate_resnet
+                      if FLAGS.generator_separate_channel else generator_resnet)
+      generator_kwargs = {} if FLAGS.generator_separate_channel else {'output_c_dim': 3}
+      if FLAGS.half_precision_denoise:
+        generator_fn = functools.partial(
+            half_precision.half_precision_generator, generator_fn,
+            loss_scale=FLAGS.loss_scale)
+      denoised_images = generator_fn(images, options, res_depth=FLAGS.res_depth, name='generator', **generator_kwargs)
       denoise_sim_loss = abs_criterion(denoised_images[:noisy_batch_size], original_images, name='g_loss/sim_loss')
       g_loss = FLAGS.denoise_loss_factor * denoise_sim_loss
       losses_dict['g_loss'] = g_loss
       summaries_dict['g_loss/sim_loss'] = tf.summary.scalar('g_loss/sim_loss', denoise_sim_loss)
       if FLAGS.denoise_discrim:
-        noisy_and_denoised = tf.concat([noisy_images, denoised_images[:noisy_batch_size]], 3)
-        noisy_and_original = tf.concat([noisy_images, original_images], 3)
-#        d_denoised = discriminator(noisy_and_denoised, FLAGS.ndf, reuse=False, name='discriminator')
-#        d_original = discriminator(noisy_and_original, FLAGS.ndf, reuse=True,  name='discriminator')
-        d_denoised = discriminator(denoised_images[:noisy_batch_size], FLAGS.ndf, FLAGS.ks, reuse=False, name='discriminator')
-        d_original = discriminator(original_images, FLAGS.ndf, FLAGS.ks, reuse=True,  name='discriminator')
+        # a single forward pass over denoised and original images; the
+        # discriminator only uses instance norm, so images do not interact.
+        d_both = discriminator(tf.concat([denoised_images[:noisy_batch_size], original_images], 0),
+                               FLAGS.ndf, FLAGS.ks, name='discriminator')
+        d_denoised, d_original = tf.split(d_both, [noisy_batch_size, -1], axis=0)
 
         # generator loss
-        g_gan_loss = criterionGAN(d_denoised, tf.ones_like(d_denoised))
+        g_gan_loss = criterionGAN(d_denoised, 1.)
         summaries_dict['g_gan_loss'] = tf.summary.scalar('g_loss/g_gan_loss', g_gan_loss)
 
         g_loss += FLAGS.denoise_gan_loss_factor * g_gan_loss
         losses_dict['g_loss'] = g_loss
 
         # discriminator loss
-        d_loss_real = criterionGAN(d_original, tf.ones_like(d_original))
-        d_loss_fake = criterionGAN(d_denoised, tf.zeros_like(d_denoised))
+        d_loss_real = criterionGAN(d_original, 1.)
+        d_loss_fake = criterionGAN(d_denoised, 0.)
 
         d_loss = FLAGS.denoise_gan_loss_factor * (d_loss_real + d_loss_fake) / 2 
         losses_dict['d_loss'] = d_loss
@@ -387,37 +420,45 @@ def gated_denoise(images, is_training, train_config):
       summaries_dict['g_loss'] = tf.summary.scalar('g_loss', g_loss)
   
     filtered_images = denoised_images
-    summaries_dict['denoised_noisy_images'] = tf.summary.image('denoised_noisy_images', filtered_images, max_outputs=1)
-    summaries_dict['denoised_clean_images'] = tf.summary.image('denoised_clean_images', filtered_images[noisy_batch_size:], max_outputs=1)
+    add_image_summary('denoised_noisy_images', filtered_images[:1])
+    add_image_summary('denoised_clean_images', filtered_images[noisy_batch_size:noisy_batch_size+1])
 
   if FLAGS.denoise:
-    with tf.variable_scope('denoise') as scope:
-      if FLAGS.generator_separate_channel:
-        denoised_images = generator_separate_resnet(filtered_images, options, res_depth=FLAGS.res_depth, reuse=False, name='generator') 
-      else:
-        denoised_images = generator_resnet(filtered_images, options, res_depth=FLAGS.res_depth, output_c_dim=3, reuse=False, name='generator') 
+    # with half_precision_denoise the generator runs in float16 on float32
+    # master weights, while the losses below stay in float32.
+    custom_getter = (
+        half_precision.float32_variable_storage_getter(FLAGS.loss_scale)
+        if FLAGS.half_precision_denoise else None)
+    with tf.variable_scope('denoise', custom_getter=custom_getter) as scope:
+      generator_fn = (generator_separate_resnet
+                      if FLAGS.generator_separate_channel else generator_resnet)
+      generator_kwargs = {} if FLAGS.generator_separate_channel else {'output_c_dim': 3}
+      if FLAGS.half_precision_denoise:
+        generator_fn = functools.partial(
+            half_precision.half_precision_generator, generator_fn,
+            loss_scale=FLAGS.loss_scale)
+      denoised_images = generator_fn(filtered_images, options, res_depth=FLAGS.res_depth, name='generator', **generator_kwargs)
       denoise_sim_loss = abs_criterion(denoised_images[:noisy_batch_size], original_images, name='g_loss/sim_loss')
       g_loss = FLAGS.denoise_loss_factor * denoise_sim_loss
       losses_dict['g_loss'] = g_loss
       summaries_dict['g_loss/sim_loss'] = tf.summary.scalar('g_loss/sim_loss', denoise_sim_loss)
       if FLAGS.denoise_discrim:
-        noisy_and_denoised = tf.concat([noisy_images, denoised_images[:noisy_batch_size]], 3)
-        noisy_and_original = tf.concat([noisy_images, original_images], 3)
-#        d_denoised = discriminator(noisy_and_denoised, FLAGS.ndf, reuse=False, name='discriminator')
-#        d_original = discriminator(noisy_and_original, FLAGS.ndf, reuse=True,  name='discriminator')
-        d_denoised = discriminator(denoised_images[:noisy_batch_size], FLAGS.ndf, FLAGS.ks, reuse=False, name='discriminator')
-        d_original = discriminator(original_images, FLAGS.ndf, FLAGS.ks, reuse=True,  name='discriminator')
+        # a single forward pass over denoised and original images; the
+        # discriminator only uses instance norm, so images do not interact.
+        d_both = discriminator(tf.concat([denoised_images[:noisy_batch_size], original_images], 0),
+                               FLAGS.ndf, FLAGS.ks, name='discriminator')
+        d_denoised, d_original = tf.split(d_both, [noisy_batch_size, -1], axis=0)
 
         # generator loss
-        g_gan_loss = criterionGAN(d_denoised, tf.ones_like(d_denoised))
+        g_gan_loss = criterionGAN(d_denoised, 1.)
         summaries_dict['g_gan_loss'] = tf.summary.scalar('g_loss/g_gan_loss', g_gan_loss)
 
         g_loss += FLAGS.denoise_gan_loss_factor * g_gan_loss
         losses_dict['g_loss'] = g_loss
 
         # discriminator loss
-        d_loss_real = criterionGAN(d_original, tf.ones_like(d_original))
-        d_loss_fake = criterionGAN(d_denoised, tf.zeros_like(d_denoised))
+        d_loss_real = criterionGAN(d_original, 1.)
+        d_loss_fake = criterionGAN(d_denoised, 0.)
 
         d_loss = FLAGS.denoise_gan_loss_factor * (d_loss_real + d_loss_fake) / 2 
         losses_dict['d_loss'] = d_loss
@@ -427,13 +468,13 @@ def gated_denoise(images, is_training, train_config):
       summaries_dict['g_loss'] = tf.summary.scalar('g_loss', g_loss)
   
     filtered_images = denoised_images
-    summaries_dict['denoised_noisy_images'] = tf.summary.image('denoised_noisy_images', filtered_images, max_outputs=1)
-    summaries_dict['denoised_clean_images'] = tf.summary.image('denoised_clean_images', filtered_images[noisy_batch_size:], max_outputs=1)
+    add_image_summary('denoised_noisy_images', filtered_images[:1])
+    add_image_summary('denoised_clean_images', filtered_images[noisy_batch_size:noisy_batch_size+1])
 
   # Gate Operation
   if FLAGS.discrim:
     with tf.variable_scope('input_discrim') as scope:
-      d_in_logits = discriminator(images, FLAGS.ndf, FLAGS.ks, reuse=False, name='discriminator')
+      d_in_logits = discriminator(images, FLAGS.ndf, FLAGS.ks, name='discriminator')
 
       d_in_loss_real = criterionGAN2(d_in_logits[noisy_batch_size:],  tf.ones_like(d_in_logits[noisy_batch_size:]))
       d_in_loss_fake = criterionGAN2(d_in_logits[:noisy_batch_size], tf.zeros_like(d_in_logits[:noisy_batch_size]))
@@ -443,27 +484,35 @@ def gated_denoise(images, is_training, train_config):
       summaries_dict['d_in_loss'] = tf.summary.scalar('d_in_loss', d_in_loss)
       #tf.add_to_collection('losses', losses_dict['d_in_loss'])
   
-      d_in_logits = tf.reduce_mean(d_in_logits, [1, 2, 3])
-      d_in_sigmoid = tf.nn.sigmoid(d_in_logits, name='is_clean')
+      # summaries cannot be compiled and stay outside the jit scope.
+      with static_shape_jit_scope():
+        # a single reduction over the flattened logits of each image
+        d_in_logits = tf.reduce_mean(
+            tf.reshape(d_in_logits, [tf.shape(d_in_logits)[0], -1]), axis=1)
+        d_in_sigmoid = tf.nn.sigmoid(d_in_logits, name='is_clean')
+        # lerp: alpha*images + (1 - alpha)*filtered_images
+        alpha = d_in_sigmoid[:,None,None,None]
+        images = filtered_images + alpha * (images - filtered_images)
       activation_summary(d_in_sigmoid)
-      images =  tf.add(d_in_sigmoid[:,None,None,None] * images,
-                       (1 - d_in_sigmoid[:,None,None,None]) * filtered_images)
   else:
     images = filtered_images
 
-  summaries_dict['preprocessed_noisy_images'] = tf.summary.image('preprocessed_noisy_images', images, max_outputs=1)
-  summaries_dict['preprocessed_clean_images'] = tf.summary.image('preprocessed_clean_images', images[noisy_batch_size:], max_outputs=1)
+  add_image_summary('preprocessed_noisy_images', images[:1])
+  add_image_summary('preprocessed_clean_images', images[noisy_batch_size:noisy_batch_size+1])
 
   return images, losses_dict, summaries_dict
 
 
-def _create_losses(input_queue, create_model_fn, train_config):
+def _create_losses(input_queue, create_model_fn, train_config,
+                   add_summaries=True):
   """Creates loss function for a DetectionModel.
 
   Args:
-    input_queue: BatchQueue object holding enqueued tensor_dicts.
+    input_queue: DatasetQueue object holding tensor_dicts.
     create_model_fn: A function to create the DetectionModel.
     train_config: a train_pb2.TrainConfig protobuf.
+    add_summaries: whether to add image summaries. Only the chief writes
+      summaries, so the other replicas leave them out of their graphs.
   """
   detection_model = create_model_fn()
   (images, _, groundtruth_boxes_list, groundtruth_classes_list,
@@ -473,14 +522,15 @@ def _create_losses(input_queue, create_model_fn, train_config):
        train_config.merge_multiple_label_boxes)
   images = [detection_model.preprocess(image) for image in images]
 
-  # lowresolution injection
-  tf.summary.image('model_preprocessed_images', images[0])
+  if add_summaries:
+    # lowresolution injection
+    tf.summary.image('model_preprocessed_images', images[0])
 
-  # images[0] shape: (1, ?, ?, 3)
-  # groundtruth_boxes_list shape: (?, 4)
-  image_with_box = tf.image.draw_bounding_boxes(images[0],
-                        tf.expand_dims(groundtruth_boxes_list[0], 0))
-  tf.summary.image('image_with_bounding_boxes', image_with_box)
+    # images[0] shape: (1, ?, ?, 3)
+    # groundtruth_boxes_list shape: (?, 4)
+    image_with_box = tf.image.draw_bounding_boxes(images[0],
+                          tf.expand_dims(groundtruth_boxes_list[0], 0))
+    tf.summary.image('image_with_bounding_boxes', image_with_box)
 
   noise = FLAGS.gaussian_noise or FLAGS.salt_pepper_noise
   distort = FLAGS.lowres or FLAGS.snow
@@ -524,7 +574,9 @@ def _create_losses(input_queue, create_model_fn, train_config):
   images = tf.concat(images, 0)
 
   # Gated denoise
-  images, losses_dict, summaries_dict = gated_denoise(images, detection_model._is_training, train_config)
+  images, losses_dict, summaries_dict = gated_denoise(
+      images, detection_model._is_training, train_config,
+      add_summaries=add_summaries)
 
 
   # Denoise network
@@ -596,12 +648,20 @@ def train(create_tensor_dict_fn, create_model_fn, train_config, master, task,
     with tf.device(deploy_config.variables_device()):
       global_step = slim.create_global_step()
 
+    # Stage the inputs directly in GPU memory when a single GPU clone consumes
+    # them. With several clones the elements are shared, so they stay on the
+    # input device.
+    prefetch_device = None
+    if num_clones == 1 and not clone_on_cpu:
+      prefetch_device = deploy_config.clone_device(0)
+
     with tf.device(deploy_config.inputs_device()):
       input_queue = create_input_queue(
           train_config.batch_size // num_clones, create_tensor_dict_fn,
           train_config.batch_queue_capacity,
           train_config.num_batch_queue_threads,
-          train_config.prefetch_queue_capacity, data_augmentation_options)
+          train_config.prefetch_queue_capacity, data_augmentation_options,
+          prefetch_device=prefetch_device)
 
     # Gather initial summaries.
     # TODO(rathodv): See if summaries can be added/extracted from global tf
@@ -611,7 +671,8 @@ def train(create_tensor_dict_fn, create_model_fn, train_config, master, task,
 
     model_fn = functools.partial(_create_losses,
                                  create_model_fn=create_model_fn,
-                                 train_config=train_config)
+                                 train_config=train_config,
+                                 add_summaries=is_chief)
     clones = model_deploy.create_clones(deploy_config, model_fn, [input_queue])
     first_clone_scope = clones[0].scope
     print clones
@@ -810,6 +871,10 @@ def train(create_tensor_dict_fn, create_model_fn, train_config, master, task,
     session_config = tf.ConfigProto(allow_soft_placement=True,
                                     log_device_placement=False)
     session_config.gpu_options.allow_growth = True
+    if FLAGS.xla_auto_jit:
+      # let XLA cluster and fuse compilable ops across the whole graph.
+      session_config.graph_options.optimizer_options.global_jit_level = (
+          tf.OptimizerOptions.ON_1)
 
     # Save checkpoints regularly.
     keep_checkpoint_every_n_hours = train_config.keep_checkpoint_every_n_hours
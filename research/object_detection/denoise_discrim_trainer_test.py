@@ -0,0 +1,92 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.denoise_discrim_trainer."""
+
+import tensorflow as tf
+
+from object_detection import denoise_discrim_trainer
+from object_detection.core import standard_fields as fields
+
+
+def create_tensor_dict_fn(num_parallel_calls=8, transform_input_data_fn=None):
+  """Returns a dataset of a decoded image with one box and a source_id."""
+  dataset = tf.data.Dataset.from_tensors({
+      fields.InputDataFields.image: tf.zeros([4, 5, 3], dtype=tf.uint8),
+      fields.InputDataFields.source_id: tf.constant('image_000000'),
+      fields.InputDataFields.groundtruth_boxes: tf.constant(
+          [[0.0, 0.0, 1.0, 1.0]]),
+      fields.InputDataFields.groundtruth_classes: tf.constant(
+          [1], dtype=tf.int64),
+  }).repeat()
+  return dataset.map(transform_input_data_fn,
+                     num_parallel_calls=num_parallel_calls)
+
+
+class CreateInputQueueTest(tf.test.TestCase):
+
+  def _dequeue(self, prefetch_device):
+    input_queue = denoise_discrim_trainer.create_input_queue(
+        batch_size_per_clone=2,
+        create_tensor_dict_fn=create_tensor_dict_fn,
+        batch_queue_capacity=4,
+        num_batch_queue_threads=1,
+        prefetch_queue_capacity=2,
+        data_augmentation_options=[],
+        prefetch_device=prefetch_device)
+    tensor_dicts = input_queue.dequeue()
+    with self.test_session() as sess:
+      sess.run(tf.tables_initializer())
+      return sess.run(tensor_dicts)
+
+  def test_keeps_string_fields_without_prefetch_device(self):
+    tensor_dicts = self._dequeue(prefetch_device=None)
+    self.assertEqual(2, len(tensor_dicts))
+    for tensor_dict in tensor_dicts:
+      self.assertEqual(b'image_000000',
+                       tensor_dict[fields.InputDataFields.source_id])
+      self.assertAllEqual(
+          (1, 4, 5, 3), tensor_dict[fields.InputDataFields.image].shape)
+
+  def test_prefetch_device_drops_string_fields(self):
+    tensor_dicts = self._dequeue(prefetch_device='/cpu:0')
+    self.assertEqual(2, len(tensor_dicts))
+    for tensor_dict in tensor_dicts:
+      self.assertNotIn(fields.InputDataFields.source_id, tensor_dict)
+      self.assertAllEqual(
+          (1, 4, 5, 3), tensor_dict[fields.InputDataFields.image].shape)
+      self.assertAllEqual(
+          [[0.0, 0.0, 1.0, 1.0]],
+          tensor_dict[fields.InputDataFields.groundtruth_boxes])
+
+  def test_get_inputs_uses_empty_key_without_source_id(self):
+    input_queue = denoise_discrim_trainer.create_input_queue(
+        batch_size_per_clone=1,
+        create_tensor_dict_fn=create_tensor_dict_fn,
+        batch_queue_capacity=4,
+        num_batch_queue_threads=1,
+        prefetch_queue_capacity=2,
+        data_augmentation_options=[],
+        prefetch_device='/cpu:0')
+    _, keys, _, classes, _, _ = denoise_discrim_trainer.get_inputs(
+        input_queue, num_classes=2)
+    self.assertEqual([''], list(keys))
+    with self.test_session() as sess:
+      sess.run(tf.tables_initializer())
+      self.assertAllEqual([[1.0, 0.0]], sess.run(classes[0]))
+
+
+if __name__ == '__main__':
+  tf.test.main()
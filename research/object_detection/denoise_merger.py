@@ -40,16 +40,10 @@ FLAGS = flags.FLAGS
 def optimistic_restore(session, save_file):
   reader = tf.train.NewCheckpointReader(save_file)
   saved_shapes = reader.get_variable_to_shape_map()
-  var_names = sorted([(var.name, var.name.split(':')[0]) for var in tf.global_variables()
-                  if var.name.split(':')[0] in saved_shapes])
-  restore_vars = []
-  name2var = dict(zip(map(lambda x:x.name.split(':')[0], tf.global_variables()), tf.global_variables()))
-  with tf.variable_scope('', reuse=True):
-    for var_name, saved_var_name in var_names:
-      curr_var = name2var[saved_var_name]
-      var_shape = curr_var.get_shape().as_list()
-      if var_shape == saved_shapes[saved_var_name]:
-        restore_vars.append(curr_var)
+  name2var = {var.name.split(':')[0]: var for var in tf.global_variables()}
+  restore_vars = [var for name, var in name2var.items()
+                  if name in saved_shapes and
+                  var.get_shape().as_list() == saved_shapes[name]]
   saver = tf.train.Saver(restore_vars)
   saver.restore(session, save_file)
 
@@ -162,17 +156,14 @@ def get_salt_pepper_noise_image(image, ratio=0.01, rand_ratio=False):
   height = image_shape[1]
   width = image_shape[2]
 
-  # uniform [1 - ratio, 2 - ratio)
   ratio = tf.random_uniform([], maxval=ratio) if rand_ratio else ratio
-  random_tensor = 1. - ratio
-  random_tensor += tf.random_uniform(image_shape)
-  # 0: ratio, 1: 1 - ratio
-  binary_tensor = tf.floor(random_tensor)
+  # False: ratio, True: 1 - ratio
+  keep_mask = tf.random_uniform(image_shape) >= ratio
 
   # scale image from [-1, 1] to [0, 1]
   random_tensor2 = tf.random_uniform(image_shape)
   image = (image + 1.)/2.
-  noise_image = binary_tensor*image + (1.-binary_tensor)*random_tensor2
+  noise_image = tf.where(keep_mask, image, random_tensor2)
 
   # scaling pixel values to be in [-1, 1]).
   noise_image = tf.clip_by_value(noise_image*2.-1, -1, 1)
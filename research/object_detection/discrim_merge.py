@@ -47,7 +47,7 @@ import os
 import tensorflow as tf
 
 from object_detection import discrim_merger
-from object_detection.builders import input_reader_builder
+from object_detection.builders import dataset_builder
 from object_detection.builders import model_builder
 from object_detection.utils import config_util
 
@@ -79,6 +79,9 @@ flags.DEFINE_string('input_config_path', '',
                     'Path to an input_reader_pb2.InputReader config file.')
 flags.DEFINE_string('model_config_path', '',
                     'Path to a model_pb2.DetectionModel config file.')
+flags.DEFINE_string('input_cache_path', None,
+                    'Caches the decoded training examples, in memory if '
+                    'empty. See dataset_builder.build.')
 
 flags.DEFINE_boolean('discrim', False,
                      'True for enabling discriminator network.')
@@ -152,7 +155,8 @@ def main(_):
       is_training=True)
 
   create_input_dict_fn = functools.partial(
-      input_reader_builder.build, input_config)
+      dataset_builder.build, input_config,
+      cache_filename=FLAGS.input_cache_path)
 
   env = json.loads(os.environ.get('TF_CONFIG', '{}'))
   cluster_data = env.get('cluster', None)
@@ -38,70 +38,114 @@ slim = tf.contrib.slim
 flags = tf.app.flags
 FLAGS = flags.FLAGS
 
-def optimistic_restore(session, save_file):
-  reader = tf.train.NewCheckpointReader(save_file)
-  saved_shapes = reader.get_variable_to_shape_map()
-  var_names = sorted([(var.name, var.name.split(':')[0]) for var in tf.global_variables()
-                  if var.name.split(':')[0] in saved_shapes])
-  restore_vars = []
-  name2var = dict(zip(map(lambda x:x.name.split(':')[0], tf.global_variables()), tf.global_variables()))
-  with tf.variable_scope('', reuse=True):
-    for var_name, saved_var_name in var_names:
-      curr_var = name2var[saved_var_name]
-      var_shape = curr_var.get_shape().as_list()
-      if var_shape == saved_shapes[saved_var_name]:
-        restore_vars.append(curr_var)
-  saver = tf.train.Saver(restore_vars)
-  saver.restore(session, save_file)
+jit_scope = tf.contrib.compiler.jit.experimental_jit_scope
+
+def optimistic_restore(session, *save_files):
+  """Restores the variables whose name and shape match a checkpoint.
+
+  A variable found in several checkpoints is restored only from the last one,
+  so every variable is read from disk at most once.
+  """
+  name2var = {var.name.split(':')[0]: var for var in tf.global_variables()}
+  restored_names = set()
+  for save_file in reversed(save_files):
+    reader = tf.train.NewCheckpointReader(save_file)
+    saved_shapes = reader.get_variable_to_shape_map()
+    # a fine-tune checkpoint usually holds fewer variables than the graph
+    restore_vars = {name: name2var[name] for name, shape in saved_shapes.items()
+                    if name in name2var and name not in restored_names and
+                    name2var[name].get_shape().as_list() == shape}
+    if restore_vars:
+      saver = tf.train.Saver(restore_vars)
+      saver.restore(session, save_file)
+    restored_names.update(restore_vars)
 
 
 def create_input_queue(batch_size_per_clone, create_tensor_dict_fn,
                        batch_queue_capacity, num_batch_queue_threads,
-                       prefetch_queue_capacity, data_augmentation_options):
-  """Sets up reader, prefetcher and returns input queue.
+                       prefetch_queue_capacity, data_augmentation_options,
+                       prefetch_device=None):
+  """Sets up a tf.data input pipeline and returns input queue.
+
+  Decoding, data augmentation and noise injection run in the tf.data map
+  stage, so that they overlap with the model on the training device.
 
   Args:
     batch_size_per_clone: batch size to use per clone.
-    create_tensor_dict_fn: function to create tensor dictionary.
-    batch_queue_capacity: maximum number of elements to store within a queue.
-    num_batch_queue_threads: number of threads to use for batching.
-    prefetch_queue_capacity: maximum capacity of the queue used to prefetch
-                             assembled batches.
+    create_tensor_dict_fn: function like dataset_builder.build to create a
+      tf.data.Dataset of tensor dictionaries; the preprocessing function is
+      passed to it as transform_input_data_fn.
+    batch_queue_capacity: maximum number of elements to prefetch.
+    num_batch_queue_threads: number of elements to preprocess in parallel.
+    prefetch_queue_capacity: maximum number of elements to stage on
+      prefetch_device.
     data_augmentation_options: a list of tuples, where each tuple contains a
       data augmentation function and a dictionary containing arguments and their
       values (see preprocessor.py).
+    prefetch_device: optional device to stage the preprocessed tensor_dicts
+      on, e.g. the GPU of the clone consuming them. String fields cannot be
+      copied to GPU memory and are dropped then, so the image keys are empty.
+      If None, the tensor_dicts stay on the input device until they are
+      dequeued.
 
   Returns:
-    input queue: a batcher.BatchQueue object holding enqueued tensor_dicts
+    input queue: a batcher.DatasetQueue object holding tensor_dicts
       (which hold images, boxes and targets).  To get a batch of tensor_dicts,
-      call input_queue.Dequeue().
+      call input_queue.dequeue().
   """
-  tensor_dict = create_tensor_dict_fn()
-
-  tensor_dict[fields.InputDataFields.image] = tf.expand_dims(
-      tensor_dict[fields.InputDataFields.image], 0)
-
-  images = tensor_dict[fields.InputDataFields.image]
-  float_images = tf.to_float(images)
-  tensor_dict[fields.InputDataFields.image] = float_images
-
-  include_instance_masks = (fields.InputDataFields.groundtruth_instance_masks
-                            in tensor_dict)
-  include_keypoints = (fields.InputDataFields.groundtruth_keypoints
-                       in tensor_dict)
-  if data_augmentation_options:
-    tensor_dict = preprocessor.preprocess(
-        tensor_dict, data_augmentation_options,
-        func_arg_map=preprocessor.get_default_func_arg_map(
-            include_instance_masks=include_instance_masks,
-            include_keypoints=include_keypoints))
-
-  input_queue = batcher.BatchQueue(
-      tensor_dict,
-      batch_size=batch_size_per_clone,
-      batch_queue_capacity=batch_queue_capacity,
-      num_batch_queue_threads=num_batch_queue_threads,
-      prefetch_queue_capacity=prefetch_queue_capacity)
+  def preprocess_fn(tensor_dict):
+    """Preprocesses a single tensor_dict and adds its noisy image.
+
+    The noise is added here, at the resolution of the decoded image, because
+    detection_model.preprocess is not available in the input pipeline. The
+    noisy and clean images are resized together by it later, so the resizer
+    also interpolates the noise, and the lowres subsample factor and the snow
+    size are relative to the source image. This is the same order as in
+    evaluator.py, so the noise seen in training and evaluation match. The
+    [-1, 1] mapping is only the value range of the noise functions; the noisy
+    image is mapped back to [0, 255] before the feature extractor's own
+    preprocessing.
+    """
+    tensor_dict[fields.InputDataFields.image] = tf.expand_dims(
+        tensor_dict[fields.InputDataFields.image], 0)
+
+    images = tensor_dict[fields.InputDataFields.image]
+    float_images = tf.to_float(images)
+    tensor_dict[fields.InputDataFields.image] = float_images
+
+    include_instance_masks = (fields.InputDataFields.groundtruth_instance_masks
+                              in tensor_dict)
+    include_keypoints = (fields.InputDataFields.groundtruth_keypoints
+                         in tensor_dict)
+    if data_augmentation_options:
+      tensor_dict = preprocessor.preprocess(
+          tensor_dict, data_augmentation_options,
+          func_arg_map=preprocessor.get_default_func_arg_map(
+              include_instance_masks=include_instance_masks,
+              include_keypoints=include_keypoints))
+
+    if FLAGS.lowres or FLAGS.snow or FLAGS.gaussian_noise or FLAGS.salt_pepper_noise:
+      # noise functions expect pixel values in [-1, 1]
+      image = inception_preprocess(tensor_dict[fields.InputDataFields.image])
+      noisy_image = add_noise([image])[0]
+      tensor_dict[fields.InputDataFields.noisy_image] = inception_depreprocess(
+          noisy_image)
+    if prefetch_device:
+      # string fields, e.g. source_id and filename, stay on the host.
+      tensor_dict = {key: value for key, value in tensor_dict.items()
+                     if value.dtype != tf.string}
+    return tensor_dict
+
+  dataset = create_tensor_dict_fn(
+      num_parallel_calls=num_batch_queue_threads,
+      transform_input_data_fn=preprocess_fn)
+  dataset = dataset.prefetch(batch_queue_capacity)
+  if prefetch_device:
+    # must be the last transformation of the input pipeline
+    dataset = dataset.apply(tf.contrib.data.prefetch_to_device(
+        prefetch_device, buffer_size=prefetch_queue_capacity))
+
+  input_queue = batcher.DatasetQueue(dataset, batch_size=batch_size_per_clone)
   return input_queue
 
 
@@ -109,7 +153,7 @@ def get_inputs(input_queue, num_classes, merge_multiple_label_boxes=False):
   """Dequeues batch and constructs inputs to object detection model.
 
   Args:
-    input_queue: BatchQueue object holding enqueued tensor_dicts.
+    input_queue: DatasetQueue object holding tensor_dicts.
     num_classes: Number of classes.
     merge_multiple_label_boxes: Whether to merge boxes with multiple labels
       or not. Defaults to false. Merged boxes are represented with a single
@@ -128,6 +172,8 @@ def get_inputs(input_queue, num_classes, merge_multiple_label_boxes=False):
     keypoints_list: a list of 3-D float tensors of shape [num_boxes,
       num_keypoints, 2] containing keypoints for objects if present in the
       input queue. Else returns None.
+    noisy_images: a list of 3-D float tensor of noisy images if noise is
+      injected in the input pipeline. Else returns None.
   """
   read_data_list = input_queue.dequeue()
   label_id_offset = 1
@@ -152,57 +198,54 @@ def get_inputs(input_queue, num_classes, merge_multiple_label_boxes=False):
     if (merge_multiple_label_boxes and (
         masks_gt is not None or keypoints_gt is not None)):
       raise NotImplementedError('Multi-label support is only for boxes.')
-    return image, key, location_gt, classes_gt, masks_gt, keypoints_gt
+    noisy_image = read_data.get(fields.InputDataFields.noisy_image)
+    return (image, key, location_gt, classes_gt, masks_gt, keypoints_gt,
+            noisy_image)
 
+  # images have different sizes and different numbers of boxes, so they cannot
+  # be batched into one dict of tensors. This loop only runs while the graph is
+  # built; at run time the per-image ops are independent and run concurrently.
   return zip(*map(extract_images_and_targets, read_data_list))
 
 def get_salt_pepper_noise_image(image, ratio=0.01, rand_ratio=False):
 
   image_shape = tf.shape(image)
   num_batch = image_shape[0]
-  height = image_shape[1]
-  width = image_shape[2]
 
-  # uniform [1 - ratio, 2 - ratio)
-  ratio = tf.random_uniform([], maxval=ratio) if rand_ratio else ratio
-  random_tensor = 1. - ratio
-  random_tensor += tf.random_uniform(image_shape)
-  # 0: ratio, 1: 1 - ratio
-  binary_tensor = tf.floor(random_tensor)
+  # the ratio is sampled per image so that a batched call matches per-image calls
+  ratio = tf.random_uniform([num_batch, 1, 1, 1], maxval=ratio) if rand_ratio else ratio
+  # False: ratio, True: 1 - ratio
+  keep_mask = tf.random_uniform(image_shape) >= ratio
 
-  # scale image from [-1, 1] to [0, 1]
-  random_tensor2 = tf.random_uniform(image_shape)
-  image = (image + 1.)/2.
-  noise_image = binary_tensor*image + (1.-binary_tensor)*random_tensor2
-
-  # scaling pixel values to be in [-1, 1]).
-  noise_image = tf.clip_by_value(noise_image*2.-1, -1, 1)
+  # noise pixels are drawn directly in [-1, 1], the range of the image.
+  random_tensor2 = tf.random_uniform(image_shape, minval=-1., maxval=1.)
+  noise_image = tf.where(keep_mask, image, random_tensor2)
   return noise_image
 
 def get_gaussian_noise_image(image, stddev=0.15, rand_stddev=False):
 
   image_shape = tf.shape(image)
   num_batch = image_shape[0]
-  height = image_shape[1]
-  width = image_shape[2]
-  
+
   if rand_stddev:
-    sigma = tf.abs(tf.truncated_normal([num_batch], mean=0., stddev=stddev/2))
+    sigma = tf.abs(tf.truncated_normal([num_batch, 1, 1, 1], mean=0.,
+                                       stddev=stddev/2))
   else:
     sigma = stddev
   # since preprocessed input values are in [-1, 1], we use sigma*2
-  noise = tf.random_normal(image_shape, mean=0., stddev=sigma*2)
+  noise = tf.random_normal(image_shape) * (sigma*2)
   # scaling pixel values to be in [-1, 1]).
   noise_image = tf.clip_by_value(image + noise, -1, 1)
   return noise_image
 
 def get_snow_image(image, sparsity=0.05):
-  # image shape: [1, None, None, 3]
+  # image shape: [num_batch, None, None, 3]
 
-  image_shape = image.get_shape().as_list()
+  image_shape = tf.shape(image)
+  num_batch = image_shape[0]
   height = image_shape[1]
   width = image_shape[2]
-  
+
   # assume the size of the snow ball is 24.
   #    **
   #   ****
@@ -210,98 +253,159 @@ def get_snow_image(image, sparsity=0.05):
   #  ******
   #   ****
   #    **
+  snowball = tf.constant([[0, 0, 1, 1, 0, 0],
+                          [0, 1, 1, 1, 1, 0],
+                          [1, 1, 1, 1, 1, 1],
+                          [1, 1, 1, 1, 1, 1],
+                          [0, 1, 1, 1, 1, 0],
+                          [0, 0, 1, 1, 0, 0]], dtype=tf.float32)
   # based on sparsity we calculate the number of snow balls in a image
-  num_snows = int(height*width*sparsity/24)
-  
-  snow_rows = tf.random_uniform([num_snows], 0, height, dtype=tf.int32)
-  snow_cols = tf.random_uniform([num_snows], 0, width, dtype=tf.int32)
+  num_snows = tf.to_int32(tf.to_float(height*width)*sparsity/24)
+
+  batch_ids = tf.tile(tf.expand_dims(tf.range(num_batch), 1), [1, num_snows])
+  snow_rows = tf.random_uniform([num_batch, num_snows], 0, height,
+                                dtype=tf.int32)
+  snow_cols = tf.random_uniform([num_batch, num_snows], 0, width,
+                                dtype=tf.int32)
+  indices = tf.reshape(tf.stack([batch_ids, snow_rows, snow_cols], axis=-1),
+                       [-1, 3])
+  # mark the snow ball centers, then stamp all snow balls with a single conv
+  # instead of scattering each of their pixels.
+  snow_centers = tf.scatter_nd(indices, tf.ones([tf.shape(indices)[0]]),
+                               [num_batch, height, width])
+  snow_mask = tf.nn.conv2d(tf.expand_dims(snow_centers, 3),
+                           snowball[:, :, None, None],
+                           strides=4*[1], padding='SAME')
+  # overlapping snow balls add up in scatter_nd and conv2d
+  snow_mask = tf.minimum(snow_mask, 1.)
+
+  # snow is white, the maximum pixel value in [-1, 1]
+  return tf.maximum(image, 2.*snow_mask - 1.)
 
 
 def get_mr_image(image, boxes):
-  # image shape: [1, None, None, 3]
+  # image shape: [num_batch, None, None, 3]
 
   image_shape = tf.shape(image)
   height = image_shape[1]
   width = image_shape[2]
 
   # randomly select subsample factor to be 2 or 4
-  subsample = tf.floor(tf.random_uniform([], 0, 2))
-  down_height, down_width = tf.cond(tf.equal(subsample, 1),
-                              lambda: (tf.to_int32(height/2), tf.to_int32(width/2)),
-                              lambda: (tf.to_int32(height/4), tf.to_int32(width/4)))
+  subsample = 2 * tf.random_uniform([], 1, 3, dtype=tf.int32)
   downsampled_image = tf.image.resize_images(image,
-                                        [down_height, down_width])
+                                        [height // subsample, width // subsample])
 
   # randomly select resize methods
-  resize_method = tf.to_int32(tf.floor(tf.random_uniform([], 0, 4)))
-
-  upsampled_image0 = tf.image.resize_images(downsampled_image,
-                                           [height, width], method=0)
-  upsampled_image1 = tf.image.resize_images(downsampled_image,
-                                           [height, width], method=1)
-  upsampled_image2 = tf.image.resize_images(downsampled_image,
-                                           [height, width], method=2)
-  upsampled_image3 = tf.image.resize_images(downsampled_image,
-                                           [height, width], method=3)
-  upsampled_image = tf.case({tf.equal(resize_method, 0): lambda: upsampled_image0,
-                             tf.equal(resize_method, 1): lambda: upsampled_image1,
-                             tf.equal(resize_method, 2): lambda: upsampled_image2,
-                            }, default=lambda: upsampled_image3)
+  resize_method = tf.random_uniform([], 0, 4, dtype=tf.int32)
+
+  # build each resize inside its branch so that only the selected method runs.
+  # tf.switch_case is not available in TF1, but tf.case only executes the ops
+  # created inside the chosen branch function.
+  def upsample_fn(method):
+    return lambda: tf.image.resize_images(downsampled_image,
+                                          [height, width], method=method)
+  upsampled_image = tf.case([(tf.equal(resize_method, 0), upsample_fn(0)),
+                             (tf.equal(resize_method, 1), upsample_fn(1)),
+                             (tf.equal(resize_method, 2), upsample_fn(2)),
+                            ], default=upsample_fn(3))
   return upsampled_image
 
 
-def _create_losses(input_queue, create_model_fn, train_config):
+def add_noise(images):
+  """Adds noise to a list of images with a single batched op per noise type.
+
+  This is called from the tf.data map stage, so it must not create summaries.
+
+  Args:
+    images: list of image tensors of shape [1, height, width, 3] sharing the
+      same height and width.
+
+  Returns:
+    noisy_images: list of noisy image tensors of shape [1, height, width, 3].
+  """
+  # list of tensors --> tensors, so that each noise op is built once per batch
+  noisy_images = tf.concat(images, 0)
+  if FLAGS.salt_pepper_noise:
+    noisy_images = get_salt_pepper_noise_image(noisy_images, ratio=FLAGS.ratio,
+                                               rand_ratio=True)
+  if FLAGS.gaussian_noise:
+    noisy_images = get_gaussian_noise_image(noisy_images, FLAGS.stddev,
+                                            rand_stddev=False)
+  if FLAGS.lowres:
+    noisy_images = get_mr_image(noisy_images, None)
+  if FLAGS.snow:
+    noisy_images = get_snow_image(noisy_images)
+
+  # tensors --> list of tensors
+  return tf.split(noisy_images, len(images), axis=0)
+
+def inception_preprocess(images):
+  """ [0, 255] --> [-1, 1]
+  """
+  return (2.0 / 255.0) * images - 1.0
+
+def inception_depreprocess(images):
+  """ [-1, 1] --> [0, 255]
+  """
+  return (255.0 / 2.0) * (images + 1.0)
+
+def _create_losses(input_queue, create_model_fn, train_config,
+                   add_summaries=True):
   """Creates loss function for a DetectionModel.
 
   Args:
-    input_queue: BatchQueue object holding enqueued tensor_dicts.
+    input_queue: DatasetQueue object holding tensor_dicts.
     create_model_fn: A function to create the DetectionModel.
     train_config: a train_pb2.TrainConfig protobuf.
+    add_summaries: whether to add image summaries. Only the chief writes
+      summaries, so the other replicas leave them out of their graphs.
   """
+  def add_image_summary(name, image):
+    # only the first image is encoded, the summary shows a single one anyway.
+    if add_summaries:
+      tf.summary.image(name, image[:1], max_outputs=1)
+
   detection_model = create_model_fn()
   (images, _, groundtruth_boxes_list, groundtruth_classes_list,
-   groundtruth_masks_list, groundtruth_keypoints_list) = get_inputs(
+   groundtruth_masks_list, groundtruth_keypoints_list, noisy_images) = get_inputs(
        input_queue,
        detection_model.num_classes,
        train_config.merge_multiple_label_boxes)
-  images = [detection_model.preprocess(image) for image in images]
+  add_noisy_images = (FLAGS.lowres or FLAGS.snow or FLAGS.gaussian_noise or
+                      FLAGS.salt_pepper_noise)
+  if add_noisy_images:
+    # noise has been added in the input pipeline (see create_input_queue).
+    # a noisy image has the size of its clean image, so each pair is
+    # preprocessed as a single batch.
+    pairs = [detection_model.preprocess(tf.concat([noisy_image, image], 0))
+             for noisy_image, image in zip(noisy_images, images)]
+    noisy_images = [pair[:1] for pair in pairs]
+    images = [pair[1:] for pair in pairs]
+  else:
+    images = [detection_model.preprocess(image) for image in images]
 
-  # lowresolution injection
-  tf.summary.image('preprocessed_images', images[0])
+  if add_summaries:
+    # lowresolution injection
+    add_image_summary('preprocessed_images', images[0])
 
-  # images[0] shape: (1, ?, ?, 3)
-  # groundtruth_boxes_list shape: (?, 4)
-  image_with_box = tf.image.draw_bounding_boxes(images[0],
-                        tf.expand_dims(groundtruth_boxes_list[0], 0))
-  tf.summary.image('image_with_bounding_boxes', image_with_box)
+    # images[0] shape: (1, ?, ?, 3)
+    # groundtruth_boxes_list shape: (?, 4)
+    image_with_box = tf.image.draw_bounding_boxes(images[0],
+                          tf.expand_dims(groundtruth_boxes_list[0], 0))
+    add_image_summary('image_with_bounding_boxes', image_with_box)
 
   # After model's preprocess is done,
   # we double the size of the input mini batch for similarity learning
-  if FLAGS.lowres or FLAGS.snow or FLAGS.gaussian_noise or FLAGS.salt_pepper_noise:
+  if add_noisy_images:
     print('doubling input mini batch')
-    noisy_images = images
-    if FLAGS.salt_pepper_noise:
-      noisy_images = [get_salt_pepper_noise_image(image, ratio=FLAGS.ratio, rand_ratio=True)
-                      for image in noisy_images]
-      tf.summary.image('salt_pepper_noise_images', noisy_images[0])
-    if FLAGS.gaussian_noise:
-      noisy_images = [get_gaussian_noise_image(image, FLAGS.stddev, rand_stddev=False)
-#      noisy_images = [get_gaussian_noise_image(image, FLAGS.stddev, rand_stddev=True)
-                      for image in noisy_images]
-      tf.summary.image('gaussian_noise_images', noisy_images[0])
-    if FLAGS.lowres:
-      noisy_images = [get_mr_image(image, boxes) for (image, boxes)
-                     in zip(noisy_images, groundtruth_boxes_list)]
-      tf.summary.image('mixed_resolution_images', noisy_images[0])
-    if FLAGS.snow:
-      noisy_images = [get_snow_image(image) for image
-                     in noisy_images]
-      tf.summary.image('snow_images', noisy_images[0])
-
+    add_image_summary('noisy_images', noisy_images[0])
     images = noisy_images + images
-    groundtruth_boxes_list += groundtruth_boxes_list
-    groundtruth_classes_list += groundtruth_classes_list
-    groundtruth_masks_list += groundtruth_masks_list
+    # groundtruth tensors have a different number of boxes per image, so they
+    # stay per image lists; repeating the lists only copies tensor references.
+    groundtruth_boxes_list *= 2
+    groundtruth_classes_list *= 2
+    groundtruth_masks_list *= 2
+    groundtruth_keypoints_list *= 2
 
     # make sure to match the size of the images for denoise filter training
     # resize the images only when training denoise network.
@@ -314,11 +418,11 @@ def _create_losses(input_queue, create_model_fn, train_config):
     # list of tensors --> tensors
     images = tf.concat(images, 0)
 
-    image_shape = images.get_shape().as_list()
-    num_batch = image_shape[0]
-    are_noises_list = [1 for i in range(num_batch/2)]
-    are_noises_list += [0 for i in range(num_batch/2)]
-    are_noises = tf.constant(are_noises_list)
+    # the first half of the batch holds the noisy images. The batch size is
+    # read at run time, since it is not always known statically.
+    half_batch = tf.shape(images)[0] // 2
+    are_noises = tf.concat([tf.ones([half_batch], tf.int32),
+                            tf.zeros([half_batch], tf.int32)], 0)
 
   else:
     # list of tensors --> tensors
@@ -329,11 +433,18 @@ def _create_losses(input_queue, create_model_fn, train_config):
   losses_dict = {}
 
   if FLAGS.average_filter:
-    tf.summary.image('prefiltered_images', images)
+    add_image_summary('prefiltered_images', images)
+    # the box filter is separable: a row pass and a column pass cost 2k
+    # instead of k^2 adds per pixel. With SAME padding each pass divides by
+    # its own number of valid pixels, whose product is the 2-D count, so the
+    # result matches the k x k avg_pool exactly.
     filtered_images = tf.nn.avg_pool(images,
-        ksize=[1, FLAGS.filter_size, FLAGS.filter_size, 1],
+        ksize=[1, 1, FLAGS.filter_size, 1],
         strides=4*[1], padding='SAME')
-    tf.summary.image('filtered_images', filtered_images)
+    filtered_images = tf.nn.avg_pool(filtered_images,
+        ksize=[1, FLAGS.filter_size, 1, 1],
+        strides=4*[1], padding='SAME')
+    add_image_summary('filtered_images', filtered_images)
     if FLAGS.discrim:
       with tf.variable_scope('discrim') as scope:
         discrim_logits, _ = discrim(images,
@@ -343,17 +454,22 @@ def _create_losses(input_queue, create_model_fn, train_config):
                                         100*FLAGS.discrim_loss_factor))
   
         discrim_softmax = tf.nn.softmax(discrim_logits, name='softmax')
-        images =  tf.add(discrim_softmax[:,0,None,None,None]*images,
-                         discrim_softmax[:,1,None,None,None]*filtered_images)
+        # the two softmax weights sum to one, so the blend is a lerp:
+        # p0*images + p1*filtered_images = filtered_images + p0*(images - filtered_images)
+        # XLA fuses it into a single kernel that reads each image once. It
+        # compiles a kernel per input shape, so only for a fixed image size.
+        with jit_scope(compile_ops=images.get_shape().is_fully_defined()):
+          alpha = discrim_softmax[:,0,None,None,None]
+          images = filtered_images + alpha * (images - filtered_images)
     else:
       images = filtered_images
 
-  tf.summary.image('preprocessed_images', images)
+  add_image_summary('preprocessed_images', images)
 
   # Denoise network
   prediction_dict = detection_model.denoise(images)
   denoised_images = prediction_dict['denoised_images']
-  tf.summary.image('denoised_images', denoised_images)
+  add_image_summary('denoised_images', denoised_images)
 
   if any(mask is None for mask in groundtruth_masks_list):
     groundtruth_masks_list = None
@@ -416,12 +532,20 @@ def train(create_tensor_dict_fn, create_model_fn, train_config, master, task,
     with tf.device(deploy_config.variables_device()):
       global_step = slim.create_global_step()
 
+    # Stage the inputs directly in GPU memory when a single GPU clone consumes
+    # them. With several clones the elements are shared, so they stay on the
+    # input device.
+    prefetch_device = None
+    if num_clones == 1 and not clone_on_cpu:
+      prefetch_device = deploy_config.clone_device(0)
+
     with tf.device(deploy_config.inputs_device()):
       input_queue = create_input_queue(
           train_config.batch_size // num_clones, create_tensor_dict_fn,
           train_config.batch_queue_capacity,
           train_config.num_batch_queue_threads,
-          train_config.prefetch_queue_capacity, data_augmentation_options)
+          train_config.prefetch_queue_capacity, data_augmentation_options,
+          prefetch_device=prefetch_device)
 
     # Gather initial summaries.
     # TODO(rathodv): See if summaries can be added/extracted from global tf
@@ -431,7 +555,8 @@ def train(create_tensor_dict_fn, create_model_fn, train_config, master, task,
 
     model_fn = functools.partial(_create_losses,
                                  create_model_fn=create_model_fn,
-                                 train_config=train_config)
+                                 train_config=train_config,
+                                 add_summaries=is_chief)
     clones = model_deploy.create_clones(deploy_config, model_fn, [input_queue])
     first_clone_scope = clones[0].scope
 
@@ -527,8 +652,8 @@ def train(create_tensor_dict_fn, create_model_fn, train_config, master, task,
 
     with tf.Session(config=session_config) as sess:
       sess.run(tf.global_variables_initializer())
-      optimistic_restore(sess, './checkpoints/gaussian_discrim/model.ckpt-35000')
-      optimistic_restore(sess, train_config.fine_tune_checkpoint)
+      optimistic_restore(sess, './checkpoints/gaussian_discrim/model.ckpt-35000',
+                         train_config.fine_tune_checkpoint)
       saver.save(sess, train_dir + '/model.ckpt-600000')
     sess.close()   
 
@@ -48,7 +48,7 @@ import os
 import tensorflow as tf
 
 from object_detection import evaluator
-from object_detection.builders import input_reader_builder
+from object_detection.builders import dataset_builder
 from object_detection.builders import model_builder
 from object_detection.utils import config_util
 from object_detection.utils import label_map_util
@@ -73,6 +73,9 @@ flags.DEFINE_string('input_config_path', '',
                     'Path to an input_reader_pb2.InputReader config file.')
 flags.DEFINE_string('model_config_path', '',
                     'Path to a model_pb2.DetectionModel config file.')
+flags.DEFINE_string('input_cache_path', None,
+                    'File prefix to cache the decoded eval examples in for '
+                    'later evaluations. See dataset_builder.build.')
 flags.DEFINE_boolean('run_once', False, 'Option to only run a single pass of '
                      'evaluation. Overrides the `max_evals` parameter in the '
                      'provided config.')
@@ -122,6 +125,8 @@ flags.DEFINE_integer('resize_method', 0, 'Resize method '
                      '2: bicubic, 3: area')
 flags.DEFINE_boolean('upsample', True,
                      'True for low + high resolution training.')
+flags.DEFINE_boolean('half_precision_denoise', False,
+                     'True for running the denoise generator in float16.')
 FLAGS = flags.FLAGS
 
 
@@ -157,8 +162,9 @@ def main(unused_argv):
       is_training=False)
 
   create_input_dict_fn = functools.partial(
-      input_reader_builder.build,
-      input_config)
+      dataset_builder.build,
+      input_config,
+      cache_filename=FLAGS.input_cache_path)
 
   label_map = label_map_util.load_labelmap(input_config.label_map_path)
   max_num_classes = max([item.id for item in label_map.item])
@@ -18,11 +18,13 @@ This file provides a generic evaluation method that can be used to evaluate a
 DetectionModel.
 """
 
+import functools
 import logging
 import tensorflow as tf
 
 from object_detection import eval_util
-from object_detection.core import prefetcher
+from object_detection import half_precision
+from object_detection.core import batcher
 from object_detection.core import standard_fields as fields
 from object_detection.utils import object_detection_evaluation
 #from denoise import discrim, discrim_loss
@@ -31,10 +33,22 @@ from module import *
 import re
 import time
 TOWER_NAME = 'tower'
+TOWER_NAME_RE = re.compile('%s_[0-9]*/' % TOWER_NAME)
 
 flags = tf.app.flags
 FLAGS = flags.FLAGS
 
+jit_scope = tf.contrib.compiler.jit.experimental_jit_scope
+
+OPTIONS = namedtuple('OPTIONS', 'gf_dim df_dim output_c_dim is_training')
+
+# images in the result dict of _extract_prediction_tensors that are only read
+# by eval_util.visualize_detection_results
+_VISUALIZATION_IMAGE_KEYS = (fields.InputDataFields.original_image,
+                             'prefiltered_image',
+                             'filtered_image',
+                             fields.InputDataFields.image)
+
 # A dictionary of metric names to classes that implement the metric. The classes
 # in the dictionary must implement
 # utils.object_detection_evaluation.DetectionEvaluator interface.
@@ -60,7 +74,7 @@ def activation_summary(x):
   """
   # Remove 'tower_[0-9]/' from the name in case this is a multi-GPU training
   # session. This helps the clarity of presentation on tensorboard.
-  tensor_name = re.sub('%s_[0-9]*/' % TOWER_NAME, '', x.op.name)
+  tensor_name = TOWER_NAME_RE.sub('', x.op.name)
   tf.summary.histogram(tensor_name + '/activations', x)
   tf.summary.scalar(tensor_name + '/sparsity',
                                        tf.nn.zero_fraction(x))
@@ -71,52 +85,46 @@ def get_median_filter_image(image, filter_size=3):
   num_batch = image_shape[0]
   height = image_shape[1]
   width = image_shape[2]
+  num_channels = image.get_shape().as_list()[3]
+  window_size = filter_size*filter_size
 
-  # uniform [1 - ratio, 2 - ratio)
+  # the patch depth is ordered (row, col, channel), so each channel is
+  # filtered separately by moving the window pixels to the last axis.
   patches = tf.extract_image_patches(image, [1, filter_size, filter_size, 1],
                                      4*[1], 4*[1], 'SAME')
-  medians = tf.contrib.distributions.percentile(patches, 50, axis=3)
-  print (image.get_shape().as_list())
-  print (patches.get_shape().as_list())
-  print (medians.get_shape().as_list())
+  patches = tf.reshape(patches, [num_batch, height, width, window_size,
+                                 num_channels])
+  patches = tf.transpose(patches, [0, 1, 2, 4, 3])
+  # a partial sort of the upper half of each window is enough for its median
+  top_values, _ = tf.nn.top_k(patches, k=window_size//2 + 1, sorted=True)
+  medians = top_values[..., -1]
 
   return medians
 
 def get_salt_pepper_noise_image(image, ratio=0.01, rand_stddev=False):
 
   image_shape = tf.shape(image)
-  num_batch = image_shape[0]
-  height = image_shape[1]
-  width = image_shape[2]
-
-  # uniform [1 - ratio, 2 - ratio)
-  random_tensor = 1. - ratio
-  random_tensor += tf.random_uniform(image_shape)
-  # 0: ratio, 1: 1 - ratio
-  binary_tensor = tf.floor(random_tensor)
 
-  # scale image from [-1, 1] to [0, 1]
-  random_tensor2 = tf.random_uniform(image_shape)
-  image = (image + 1.)/2.
-  noise_image = binary_tensor*image + (1.-binary_tensor)*random_tensor2
+  # False: ratio, True: 1 - ratio
+  keep_mask = tf.random_uniform(image_shape) >= ratio
 
-  # scaling pixel values to be in [-1, 1]).
-  noise_image = tf.clip_by_value(noise_image*2.-1, -1, 1)
+  # noise pixels are drawn directly in [-1, 1], the range of the image.
+  random_tensor2 = tf.random_uniform(image_shape, minval=-1., maxval=1.)
+  noise_image = tf.where(keep_mask, image, random_tensor2)
   return noise_image
 
 def get_gaussian_noise_image(image, stddev=0.15, rand_stddev=False):
 
   image_shape = tf.shape(image)
   num_batch = image_shape[0]
-  height = image_shape[1]
-  width = image_shape[2]
-  
+
   if rand_stddev:
-    sigma = tf.abs(tf.truncated_normal([num_batch], mean=0., stddev=stddev/2))
+    sigma = tf.abs(tf.truncated_normal([num_batch, 1, 1, 1], mean=0.,
+                                       stddev=stddev/2))
   else:
     sigma = stddev
   # since preprocessed input values are in [-1, 1], we use sigma*2
-  noise = tf.random_normal(image_shape, mean=0., stddev=sigma*2)
+  noise = tf.random_normal(image_shape) * (sigma*2)
   # scaling pixel values to be in [-1, 1]).
   noise_image = tf.clip_by_value(image + noise, -1, 1)
   return noise_image
@@ -130,8 +138,18 @@ def get_lowres_image(image, factor=1, method=0, upsample=True):
   # subsample
   down_height = tf.to_int32(height/factor)
   down_width = tf.to_int32(width/factor)
-  downsampled_image = tf.image.resize_images(image,
-                                        [down_height, down_width])
+  resize_fn = lambda: tf.image.resize_images(image, [down_height, down_width])
+  if isinstance(factor, int):
+    # when an integer factor divides the image size, the bilinear downsample
+    # reads exactly every factor-th pixel, so a strided slice gives the same
+    # image without interpolation.
+    is_dividable = tf.logical_and(tf.equal(height % factor, 0),
+                                  tf.equal(width % factor, 0))
+    downsampled_image = tf.cond(is_dividable,
+                                lambda: image[:, ::factor, ::factor],
+                                resize_fn)
+  else:
+    downsampled_image = resize_fn()
 
   # resize
   upsampled_image = downsampled_image
@@ -150,21 +168,27 @@ def resize_dividable_image(image, number):
   # image shape: [1, None, None, 3]
 
   image_shape = tf.shape(image)
-  height = image_shape[1]/number*number
-  width = image_shape[2]/number*number
-  return tf.image.resize_images(image, [height, width])
+  height = image_shape[1] // number * number
+  width = image_shape[2] // number * number
+  # resizing to the same size is an identity, so only resize when needed
+  is_dividable = tf.logical_and(tf.equal(height, image_shape[1]),
+                                tf.equal(width, image_shape[2]))
+  return tf.cond(is_dividable,
+                 lambda: image,
+                 lambda: tf.image.resize_images(image, [height, width]))
   
 def gated_denoise(images, is_training, FLAGS):
   # Discriminator Network
   # We are just mixing the two images
+  # XLA compiles a kernel for every input shape it sees, and eval images keep
+  # their own sizes; only compile the clusters when the shape is fixed.
+  static_shape_jit_scope = functools.partial(
+      jit_scope, compile_ops=None not in images.get_shape().as_list())
   losses_dict = {}
   summaries_dict = {}
 
-  OPTIONS = namedtuple('OPTIONS', 'gf_dim df_dim output_c_dim is_training')
   options = OPTIONS._make((FLAGS.ngf, FLAGS.ndf, 3, is_training))
-  criterionGAN = mae_criterion
-  criterionGAN2 = sce_criterion
-  
+
   # Filter
   summaries_dict['prefiltered_noisy_images'] = tf.summary.image('prefiltered_noisy_images', images, max_outputs=1)
 
@@ -173,28 +197,29 @@ def gated_denoise(images, is_training, FLAGS):
     if FLAGS.mixture_of_filters:
       with tf.variable_scope('filter_gate') as scope:
         print('Building mixture of filters model')
-        filtered_images0 = average_filter(images, 2)
-        filtered_images1 = average_filter(images, 3)
-        filtered_images2 = average_filter(images, 4)
-        probs = gate(images, FLAGS.ndf, num_classes=4, reuse=False, name='gate')
+        probs = gate(images, FLAGS.ndf, num_classes=4, name='gate')
         activation_summary(probs)
-        filtered_images = tf.add_n([probs[:,0,None,None,None]*images,
-                                    probs[:,1,None,None,None]*filtered_images0,
-                                    probs[:,2,None,None,None]*filtered_images1,
-                                    probs[:,3,None,None,None]*filtered_images2])
+        # the identity and the 2x2, 3x3 and 4x4 average filters are computed
+        # by one depthwise convolution and mixed in a single weighted sum.
+        filtered_images = mixture_of_average_filters(images, probs,
+                                                     filter_sizes=(1, 2, 3, 4))
     else:
       filtered_images = average_filter(images, FLAGS.filter_size)
     summaries_dict['filtered_noisy_images'] = tf.summary.image('filtered_noisy_images', filtered_images, max_outputs=1)
 
   if FLAGS.denoise:
-    with tf.variable_scope('denoise') as scope:
-      if FLAGS.generator_separate_channel:
-        denoised_images = generator_separate_resnet(filtered_images, options, res_depth=FLAGS.res_depth, reuse=False, name='generator') 
-      else:
-        denoised_images = generator_resnet(filtered_images, options, res_depth=FLAGS.res_depth, output_c_dim=3, reuse=False, name='generator') 
-      if FLAGS.denoise_discrim:
-        noisy_and_denoised = tf.concat([noisy_images, denoised_images], 3)
-        d_denoised = discriminator(denoised, FLAGS.ndf, FLAGS.ks, reuse=False, name='discriminator')
+    # with half_precision_denoise the generator runs in float16 on the float32
+    # weights of the checkpoint, while the gate stays in float32.
+    custom_getter = (half_precision.float32_variable_storage_getter()
+                     if FLAGS.half_precision_denoise else None)
+    with tf.variable_scope('denoise', custom_getter=custom_getter) as scope:
+      generator_fn = (generator_separate_resnet
+                      if FLAGS.generator_separate_channel else generator_resnet)
+      generator_kwargs = {} if FLAGS.generator_separate_channel else {'output_c_dim': 3}
+      if FLAGS.half_precision_denoise:
+        generator_fn = functools.partial(half_precision.half_precision_generator,
+                                         generator_fn)
+      denoised_images = generator_fn(filtered_images, options, res_depth=FLAGS.res_depth, name='generator', **generator_kwargs)
 
     filtered_images = denoised_images
     summaries_dict['filtered_noisy_images'] = tf.summary.image('filtered_noisy_images', filtered_images, max_outputs=1)
@@ -202,12 +227,14 @@ def gated_denoise(images, is_training, FLAGS):
   # Gate Operation
   if FLAGS.discrim:
     with tf.variable_scope('input_discrim') as scope:
-      d_in_logits = discriminator(images, FLAGS.ndf, FLAGS.ks, reuse=False, name='discriminator')
+      d_in_logits = discriminator(images, FLAGS.ndf, FLAGS.ks, name='discriminator')
       d_in_logits = tf.reduce_mean(d_in_logits, [1, 2, 3])
       d_in_sigmoid = tf.nn.sigmoid(d_in_logits, name='is_clean')
       activation_summary(d_in_sigmoid)
-      images =  tf.add(d_in_sigmoid[:,None,None,None] * images,
-                       (1 - d_in_sigmoid[:,None,None,None]) * filtered_images)
+      with static_shape_jit_scope():
+        # lerp: alpha*images + (1 - alpha)*filtered_images
+        alpha = d_in_sigmoid[:,None,None,None]
+        images = filtered_images + alpha * (images - filtered_images)
   else:
     images = filtered_images
 
@@ -225,6 +252,11 @@ def inception_depreprocess(images):
   """
   return (255.0 / 2.0) * (images + 1.0)
 
+def inception_depreprocess_uint8(images):
+  """ [-1, 1] --> uint8 [0, 255]
+  """
+  return tf.saturate_cast(images * 127.5 + 127.5, tf.uint8)
+
 def _extract_prediction_tensors(model,
                                 create_input_dict_fn,
                                 ignore_groundtruth=False):
@@ -232,40 +264,43 @@ def _extract_prediction_tensors(model,
 
   Args:
     model: model to perform predictions with.
-    create_input_dict_fn: function to create input tensor dictionaries.
+    create_input_dict_fn: function to create a tf.data.Dataset of input tensor
+      dictionaries (see builders/dataset_builder.py).
     ignore_groundtruth: whether groundtruth should be ignored.
 
   Returns:
     tensor_dict: A tensor dictionary with evaluations.
   """
-  input_dict = create_input_dict_fn()
-  prefetch_queue = prefetcher.prefetch(input_dict, capacity=500)
-  input_dict = prefetch_queue.dequeue()
+  def preprocess_fn(tensor_dict):
+    """Adds the noisy image of a single tensor_dict."""
+    image = tf.expand_dims(tensor_dict[fields.InputDataFields.image], 0)
+    noisy_image = inception_preprocess(tf.to_float(image))
+    if FLAGS.salt_pepper_noise:
+      noisy_image = get_salt_pepper_noise_image(noisy_image,
+                                                ratio=FLAGS.ratio)
+    if FLAGS.gaussian_noise:
+      noisy_image = get_gaussian_noise_image(noisy_image,
+                                             stddev=FLAGS.stddev)
+    if FLAGS.lowres:
+      noisy_image = get_lowres_image(noisy_image,
+                                     factor=FLAGS.subsample_factor,
+                                     method=FLAGS.resize_method,
+                                     upsample=FLAGS.upsample)
+    tensor_dict[fields.InputDataFields.noisy_image] = noisy_image
+    return tensor_dict
+
+  # decoding, normalization and noise injection run in the tf.data map stage,
+  # so that they overlap with the model. Summaries cannot be created there.
+  dataset = create_input_dict_fn(transform_input_data_fn=preprocess_fn)
+  dataset = dataset.prefetch(500)
+  input_queue = batcher.DatasetQueue(dataset, batch_size=1)
+  input_dict = input_queue.dequeue()[0]
   original_image = tf.expand_dims(input_dict[fields.InputDataFields.image], 0)
 
-
-  preprocessed_image = inception_preprocess(tf.to_float(original_image))
-
-  tf.summary.image('preprocessed_images', preprocessed_image[0])
-
-  if FLAGS.salt_pepper_noise:
-    preprocessed_image = get_salt_pepper_noise_image(preprocessed_image,
-                                                     ratio=FLAGS.ratio)
-    tf.summary.image('salt_pepper_noise_images', preprocessed_image[0])
-  if FLAGS.gaussian_noise:
-    preprocessed_image = get_gaussian_noise_image(preprocessed_image,
-                                                  stddev=FLAGS.stddev)
-    tf.summary.image('gaussian_noise_images', preprocessed_image[0])
-  if FLAGS.lowres:
-    preprocessed_image = get_lowres_image(preprocessed_image,
-                                    factor=FLAGS.subsample_factor,
-                                    method=FLAGS.resize_method,
-                                    upsample=FLAGS.upsample)
-    tf.summary.image('lowres_images', preprocessed_image[0])
-  
   # prefiltered_image
-  prefiltered_image = preprocessed_image
-  tf.summary.image('prefiltered_images', prefiltered_image[0])
+  prefiltered_image = input_dict[fields.InputDataFields.noisy_image]
+  tf.summary.image('prefiltered_images', prefiltered_image)
+  preprocessed_image = prefiltered_image
 
 #  # apply filter here
 #  if FLAGS.median_filter:
@@ -306,9 +341,9 @@ def _extract_prediction_tensors(model,
 
   # original image
   # change preprocessed_image to uint8 image tensor
-  filtered_image = tf.to_int32(255 * (filtered_image + 1) / 2)
-  prefiltered_image = tf.to_int32(255 * (prefiltered_image + 1) / 2)
-  preprocessed_image = tf.to_int32(255 * (preprocessed_image_for_summary + 1) / 2)
+  filtered_image = inception_depreprocess_uint8(filtered_image)
+  prefiltered_image = inception_depreprocess_uint8(prefiltered_image)
+  preprocessed_image = inception_depreprocess_uint8(preprocessed_image_for_summary)
 
   groundtruth = None
   if not ignore_groundtruth:
@@ -419,6 +454,12 @@ def evaluate(create_input_dict_fn, create_model_fn, eval_config, categories,
     Returns:
       result_dict: a dictionary of numpy arrays
     """
+    if batch_index >= eval_config.num_visualizations:
+      # the images are only used for visualization, so the other batches do
+      # not copy them to the host. They are still converted, since the eval
+      # results read the shape of the preprocessed image.
+      tensor_dict = {key: value for key, value in tensor_dict.items()
+                     if key not in _VISUALIZATION_IMAGE_KEYS}
     try:
       result_dict = sess.run(tensor_dict)
       counters['success'] += 1
@@ -0,0 +1,62 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.evaluator."""
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection import evaluator
+
+
+def _median_filter(image, filter_size):
+  """Per channel median filter with the zero padding of 'SAME' patches."""
+  pad = (filter_size - 1) // 2
+  padded_image = np.pad(
+      image, [(0, 0), (pad, filter_size - 1 - pad),
+              (pad, filter_size - 1 - pad), (0, 0)], 'constant')
+  num_batch, height, width, num_channels = image.shape
+  medians = np.zeros_like(image)
+  for b in range(num_batch):
+    for y in range(height):
+      for x in range(width):
+        for c in range(num_channels):
+          window = padded_image[b, y:y+filter_size, x:x+filter_size, c]
+          medians[b, y, x, c] = np.median(window)
+  return medians
+
+
+class GetMedianFilterImageTest(tf.test.TestCase):
+
+  def _test_median_filter(self, filter_size):
+    image_np = np.random.uniform(
+        -1, 1, size=[2, 6, 9, 3]).astype(np.float32)
+    image = tf.placeholder(tf.float32, shape=[None, None, None, 3])
+    medians = evaluator.get_median_filter_image(image, filter_size)
+
+    with self.test_session() as sess:
+      medians_out = sess.run(medians, feed_dict={image: image_np})
+      self.assertAllEqual(medians_out.shape, image_np.shape)
+      self.assertAllClose(medians_out, _median_filter(image_np, filter_size))
+
+  def test_median_filter_3x3(self):
+    self._test_median_filter(3)
+
+  def test_median_filter_5x5(self):
+    self._test_median_filter(5)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -0,0 +1,86 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Float16 execution of the denoise generators.
+
+The generators run in float16 on float32 master weights, while the inputs,
+outputs and losses around them stay in float32. With a loss scale, the
+gradients inside the generator are computed on a scaled loss so that small
+values do not underflow in float16; the scale is removed again at every
+float32 boundary of the generator: its variables and its input.
+"""
+
+import tensorflow as tf
+
+
+def scale_gradient(x, scale):
+  """Identity op that multiplies the gradient flowing through it by scale."""
+  @tf.custom_gradient
+  def _identity(x):
+    return tf.identity(x), lambda dy: dy * scale
+  return _identity(x)
+
+
+def float32_variable_storage_getter(loss_scale=1.):
+  """Returns a custom getter that stores float16 variables in float32.
+
+  The variables are created in float32, as in the checkpoints, and cast to
+  float16 when they are read, so that the optimizer updates float32 master
+  weights.
+
+  Args:
+    loss_scale: the scale of the loss the float16 gradients are computed on.
+      It is undone in float32 on the gradients of the variables.
+
+  Returns:
+    A custom getter for tf.variable_scope.
+  """
+  def _getter(getter, name, shape=None, dtype=None, trainable=True,
+              *args, **kwargs):
+    storage_dtype = tf.float32 if trainable else dtype
+    variable = getter(name, shape, dtype=storage_dtype, trainable=trainable,
+                      *args, **kwargs)
+    if trainable and dtype == tf.float16:
+      if loss_scale != 1.:
+        variable = scale_gradient(variable, 1. / loss_scale)
+      variable = tf.cast(variable, tf.float16)
+    return variable
+  return _getter
+
+
+def half_precision_generator(generator_fn, images, *args, **kwargs):
+  """Runs generator_fn in float16 and returns its output in float32.
+
+  Args:
+    generator_fn: the generator, e.g. module.generator_resnet. It has to be
+      called under a variable scope with float32_variable_storage_getter.
+    images: float32 input images.
+    *args: positional arguments of generator_fn.
+    **kwargs: keyword arguments of generator_fn, and optionally loss_scale,
+      which has to match the loss_scale of the custom getter.
+
+  Returns:
+    The float32 output of generator_fn.
+  """
+  loss_scale = kwargs.pop('loss_scale', 1.)
+  if loss_scale != 1.:
+    # the scale is removed from the gradient that leaves the generator through
+    # its input, so the layers in front of it see unscaled gradients.
+    images = scale_gradient(images, 1. / loss_scale)
+  denoised_images = generator_fn(tf.cast(images, tf.float16), *args, **kwargs)
+  denoised_images = tf.cast(denoised_images, tf.float32)
+  if loss_scale != 1.:
+    denoised_images = scale_gradient(denoised_images, loss_scale)
+  return denoised_images
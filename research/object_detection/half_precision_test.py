@@ -0,0 +1,93 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.half_precision."""
+
+from collections import namedtuple
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection import half_precision
+from object_detection import module
+
+LOSS_SCALE = 128.
+
+OPTIONS = namedtuple('OPTIONS', 'gf_dim df_dim output_c_dim is_training')
+
+
+class HalfPrecisionGeneratorTest(tf.test.TestCase):
+
+  def _build_loss(self, images, targets, half_precision_denoise):
+    """Builds the gate, srcnn and denoise chain of gated_denoise."""
+    options = OPTIONS._make((4, 4, 3, True))
+    with tf.variable_scope('model', reuse=tf.AUTO_REUSE):
+      with tf.variable_scope('filter_gate'):
+        probs = module.gate(images, 4, num_classes=4, name='gate')
+        filtered_images = module.mixture_of_average_filters(images, probs)
+      with tf.variable_scope('srcnn'):
+        filtered_images = module.generator_resnet(
+            filtered_images, options, res_depth=1, output_c_dim=3,
+            name='generator')
+      custom_getter = (
+          half_precision.float32_variable_storage_getter(LOSS_SCALE)
+          if half_precision_denoise else None)
+      with tf.variable_scope('denoise', custom_getter=custom_getter):
+        if half_precision_denoise:
+          denoised_images = half_precision.half_precision_generator(
+              module.generator_resnet, filtered_images, options, res_depth=1,
+              output_c_dim=3, name='generator', loss_scale=LOSS_SCALE)
+        else:
+          denoised_images = module.generator_resnet(
+              filtered_images, options, res_depth=1, output_c_dim=3,
+              name='generator')
+    return module.abs_criterion(denoised_images, targets)
+
+  def test_gradients_match_float32(self):
+    images = tf.constant(
+        np.random.uniform(-1, 1, size=[2, 16, 16, 3]).astype(np.float32))
+    targets = tf.constant(
+        np.random.uniform(-1, 1, size=[2, 16, 16, 3]).astype(np.float32))
+    # both losses share the same float32 variables.
+    loss = self._build_loss(images, targets, half_precision_denoise=False)
+    half_loss = self._build_loss(images, targets, half_precision_denoise=True)
+
+    for scope in ['model/filter_gate', 'model/srcnn', 'model/denoise']:
+      variables = tf.trainable_variables(scope)
+      self.assertTrue(variables)
+      self.assertTrue(all(v.dtype.base_dtype == tf.float32 for v in variables))
+      gradient_norm = tf.global_norm(tf.gradients(loss, variables))
+      half_gradient_norm = tf.global_norm(tf.gradients(half_loss, variables))
+      with self.test_session() as sess:
+        sess.run(tf.global_variables_initializer())
+        gradient_norm_out, half_gradient_norm_out = sess.run(
+            [gradient_norm, half_gradient_norm])
+      # float16 is only accurate to about three digits, but a gradient that
+      # still carries the loss scale would be LOSS_SCALE times too large.
+      self.assertGreater(gradient_norm_out, 0.)
+      self.assertNear(half_gradient_norm_out / gradient_norm_out, 1., 0.1)
+
+  def test_float32_variable_storage_getter_without_loss_scale(self):
+    with tf.variable_scope(
+        'model',
+        custom_getter=half_precision.float32_variable_storage_getter()):
+      variable = tf.get_variable('weights', [3], dtype=tf.float16)
+    self.assertEqual(tf.float16, variable.dtype.base_dtype)
+    self.assertEqual(tf.float32,
+                     tf.trainable_variables('model')[0].dtype.base_dtype)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -1,16 +1,13 @@
 from __future__ import division
+import numpy as np
 import tensorflow as tf
 from ops import *
 #from utils import *
 
-def gate(image, df_dim=16, num_classes=2, reuse=False, name="gate"):
+def gate(image, df_dim=16, num_classes=2, name="gate"):
 
-    with tf.variable_scope(name):
+    with tf.variable_scope(name, reuse=tf.AUTO_REUSE):
         # image is 256 x 256 x input_c_dim
-        if reuse:
-            tf.get_variable_scope().reuse_variables()
-        else:
-            assert tf.get_variable_scope().reuse is False
 
         h0 = lrelu(conv2d(image, df_dim, name='d_h0_conv'))
         # h0 is (128 x 128 x self.df_dim)
@@ -27,14 +24,10 @@ def gate(image, df_dim=16, num_classes=2, reuse=False, name="gate"):
         probs = tf.nn.softmax(logits, name='softmax')
         return probs
 
-def discriminator(image, df_dim=16, ks=3, df_last_dim=1, reuse=False, name="discriminator"):
+def discriminator(image, df_dim=16, ks=3, df_last_dim=1, name="discriminator"):
 
-    with tf.variable_scope(name):
+    with tf.variable_scope(name, reuse=tf.AUTO_REUSE):
         # image is 256 x 256 x input_c_dim
-        if reuse:
-            tf.get_variable_scope().reuse_variables()
-        else:
-            assert tf.get_variable_scope().reuse is False
 
         h0 = lrelu(conv2d(image, df_dim, ks=ks, name='d_h0_conv'))
         # h0 is (128 x 128 x self.df_dim)
@@ -50,17 +43,51 @@ def discriminator(image, df_dim=16, ks=3, df_last_dim=1, reuse=False, name="disc
 
 def average_filter(image, filter_size):
     return tf.nn.avg_pool(image, ksize=[1, filter_size, filter_size, 1], strides=4*[1], padding='SAME')
+
+_BOX_KERNELS = {}
+
+def _box_filter_kernel(filter_sizes, num_channels):
+    """Returns the depthwise box filter kernel, built once per configuration.
+
+    Each box filter is embedded in a max_size x max_size kernel, aligned with
+    the 'SAME' padding of its own size.
+    """
+    key = (tuple(filter_sizes), num_channels)
+    if key not in _BOX_KERNELS:
+        max_size = max(filter_sizes)
+        kernels = np.zeros([max_size, max_size, 1, len(filter_sizes)], dtype=np.float32)
+        for i, size in enumerate(filter_sizes):
+            offset = (max_size - 1) // 2 - (size - 1) // 2
+            kernels[offset:offset+size, offset:offset+size, 0, i] = 1.
+        _BOX_KERNELS[key] = np.tile(kernels, [1, 1, num_channels, 1])
+    return _BOX_KERNELS[key]
+
+def mixture_of_average_filters(image, probs, filter_sizes=(1, 2, 3, 4)):
+    """Mixes average filters of the image, weighted per image by probs.
+
+    Equivalent to summing probs[:, i] * average_filter(image, filter_sizes[i]),
+    but all filters are computed by a single depthwise convolution.
+    """
+    num_channels = image.get_shape().as_list()[3]
+    kernel = _box_filter_kernel(filter_sizes, num_channels)
+
+    # sums: [batch, height, width, channels * num_filters]
+    sums = tf.nn.depthwise_conv2d(image, kernel, strides=4*[1], padding='SAME')
+    # like avg_pool, divide by the number of pixels inside the image.
+    counts = tf.nn.depthwise_conv2d(tf.ones_like(image[:1, :, :, :1]), kernel[:, :, :1, :],
+                                    strides=4*[1], padding='SAME')
+    image_shape = tf.shape(image)
+    sums = tf.reshape(sums, [image_shape[0], image_shape[1], image_shape[2],
+                             num_channels, len(filter_sizes)])
+    weights = probs[:, None, None, None, :] / counts[:, :, :, None, :]
+    return tf.reduce_sum(sums * weights, axis=4)
   
 
-def generator_unet(image, options, reuse=False, name="generator"):
+def generator_unet(image, options, name="generator"):
 
 #    dropout_rate = 0.5 if options.is_training else 1.0
-    with tf.variable_scope(name):
+    with tf.variable_scope(name, reuse=tf.AUTO_REUSE):
         # image is 256 x 256 x input_c_dim
-        if reuse:
-            tf.get_variable_scope().reuse_variables()
-        else:
-            assert tf.get_variable_scope().reuse is False
 
         # image is (256 x 256 x input_c_dim)
         e1 = instance_norm(conv2d(image, options.gf_dim, name='g_e1_conv'))
@@ -117,24 +144,23 @@ def generator_unet(image, options, reuse=False, name="generator"):
         return tf.nn.tanh(d8)
 
 
-def generator_separate_resnet(image, options, res_depth=3, reuse=False, name="generator"):
-    image0 = generator_resnet(tf.expand_dims(image[:,:,:,0], -1),
-                              options, res_depth, 1, reuse, name)
-    image1 = generator_resnet(tf.expand_dims(image[:,:,:,1], -1),
-                              options, res_depth, 1, True, name)
-    image2 = generator_resnet(tf.expand_dims(image[:,:,:,2], -1),
-                              options, res_depth, 1, True, name)
-    pred = tf.concat([image0, image1, image2], -1)
-    return pred
+def generator_separate_resnet(image, options, res_depth=3, name="generator"):
+    # the channels share one single channel generator, and instance_norm
+    # normalizes each image and channel on its own, so the channels are
+    # stacked along the batch axis and denoised in one pass:
+    # [N, H, W, 3] --> [3*N, H, W, 1]
+    image_shape = tf.shape(image)
+    channels = tf.reshape(tf.transpose(image, [3, 0, 1, 2]),
+                          [-1, image_shape[1], image_shape[2], 1])
+    pred = generator_resnet(channels, options, res_depth, 1, name)
+    # [3*N, H, W, 1] --> [N, H, W, 3]
+    pred = tf.reshape(pred, [3, image_shape[0], image_shape[1], image_shape[2]])
+    return tf.transpose(pred, [1, 2, 3, 0])
 
-def generator_resnet(image, options, res_depth=3, output_c_dim=1, reuse=False, name="generator"):
+def generator_resnet(image, options, res_depth=3, output_c_dim=1, name="generator"):
 
-    with tf.variable_scope(name):
+    with tf.variable_scope(name, reuse=tf.AUTO_REUSE):
         # image is 256 x 256 x input_c_dim
-        if reuse:
-            tf.get_variable_scope().reuse_variables()
-        else:
-            assert tf.get_variable_scope().reuse is False
 
         def residule_block(x, dim, ks=3, s=1, name='res'):
             p = int((ks - 1) / 2)
@@ -153,35 +179,10 @@ def generator_resnet(image, options, res_depth=3, output_c_dim=1, reuse=False, n
         c1 = tf.nn.relu(instance_norm(conv2d(image, options.gf_dim*1, ks, 1, padding='SAME', name='g_e1_c'), 'g_e1_bn'))
         c2 = tf.nn.relu(instance_norm(conv2d(c1, options.gf_dim*2, 3, 2, name='g_e2_c'), 'g_e2_bn'))
         c3 = tf.nn.relu(instance_norm(conv2d(c2, options.gf_dim*4, 3, 2, name='g_e3_c'), 'g_e3_bn'))
-        # define G network with 9 resnet blocks
+        # define G network with res_depth resnet blocks
         rn = c3
-        if res_depth >= 1:
-          r1 = residule_block(c3, options.gf_dim*4, name='g_r1')
-          rn = r1
-        if res_depth >= 2:
-          r2 = residule_block(r1, options.gf_dim*4, name='g_r2')
-          rn = r2
-        if res_depth >= 3:
-          r3 = residule_block(r2, options.gf_dim*4, name='g_r3')
-          rn = r3
-        if res_depth >= 4:
-          r4 = residule_block(r3, options.gf_dim*4, name='g_r4')
-          rn = r4
-        if res_depth >= 5:
-          r5 = residule_block(r4, options.gf_dim*4, name='g_r5')
-          rn = r5
-        if res_depth >= 6:
-          r6 = residule_block(r5, options.gf_dim*4, name='g_r6')
-          rn = r6
-        if res_depth >= 7:
-          r7 = residule_block(r6, options.gf_dim*4, name='g_r7')
-          rn = r7
-        if res_depth >= 8:
-          r8 = residule_block(r7, options.gf_dim*4, name='g_r8')
-          rn = r8
-        if res_depth == 9:
-          r9 = residule_block(r8, options.gf_dim*4, name='g_r9')
-          rn = r9
+        for i in range(1, res_depth + 1):
+            rn = residule_block(rn, options.gf_dim*4, name='g_r%d' % i)
         d1 = deconv2d(rn, options.gf_dim*2, 3, 2, name='g_d1_dc')
         d1 = c2 + tf.nn.relu(instance_norm(d1, 'g_d1_bn'))
         d2 = deconv2d(d1, options.gf_dim, 3, 2, name='g_d2_dc')
@@ -0,0 +1,57 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.module."""
+
+import tensorflow as tf
+
+from object_detection import module
+
+
+class MixtureOfAverageFiltersTest(tf.test.TestCase):
+
+  def test_matches_weighted_sum_of_average_filters(self):
+    filter_sizes = (1, 2, 3, 4)
+    # a non-square image, so that the asymmetric 'SAME' padding of the even
+    # filter sizes is checked along both axes, border pixels included.
+    image = tf.random_uniform([2, 7, 10, 3])
+    probs = tf.nn.softmax(tf.random_normal([2, len(filter_sizes)]))
+
+    mixed_image = module.mixture_of_average_filters(image, probs, filter_sizes)
+    expected_image = tf.add_n(
+        [probs[:, i, None, None, None] * module.average_filter(image, size)
+         for i, size in enumerate(filter_sizes)])
+
+    with self.test_session() as sess:
+      mixed_image_out, expected_image_out = sess.run(
+          [mixed_image, expected_image])
+      self.assertAllEqual(mixed_image_out.shape, [2, 7, 10, 3])
+      self.assertAllClose(mixed_image_out, expected_image_out)
+
+  def test_single_filter_matches_average_filter(self):
+    image = tf.random_uniform([1, 5, 8, 3])
+    probs = tf.ones([1, 1])
+
+    mixed_image = module.mixture_of_average_filters(image, probs, (4,))
+    expected_image = module.average_filter(image, 4)
+
+    with self.test_session() as sess:
+      mixed_image_out, expected_image_out = sess.run(
+          [mixed_image, expected_image])
+      self.assertAllClose(mixed_image_out, expected_image_out)
+
+
+if __name__ == '__main__':
+  tf.test.main()
@@ -12,13 +12,18 @@ def batch_norm(x, name="batch_norm"):
 def instance_norm(input, name="instance_norm"):
     with tf.variable_scope(name):
         depth = input.get_shape()[3]
-        scale = tf.get_variable("scale", [depth], initializer=tf.random_normal_initializer(1.0, 0.02, dtype=tf.float32))
-        offset = tf.get_variable("offset", [depth], initializer=tf.constant_initializer(0.0))
-        mean, variance = tf.nn.moments(input, axes=[1,2], keep_dims=True)
+        scale = tf.get_variable("scale", [depth], dtype=input.dtype.base_dtype, initializer=tf.random_normal_initializer(1.0, 0.02, dtype=tf.float32))
+        offset = tf.get_variable("offset", [depth], dtype=input.dtype.base_dtype, initializer=tf.constant_initializer(0.0))
         epsilon = 1e-5
-        inv = tf.rsqrt(variance + epsilon)
-        normalized = (input-mean)*inv
-        return scale*normalized + offset
+        if input.get_shape()[0].value == 1 and input.dtype == tf.float32:
+            # with a single instance the batch statistics are the instance
+            # statistics, so the whole normalization is one fused kernel.
+            return tf.nn.fused_batch_norm(input, scale, offset, epsilon=epsilon,
+                                          is_training=True)[0]
+        mean, variance = tf.nn.moments(input, axes=[1,2], keep_dims=True)
+        # folds scale and offset into the per instance statistics, so that the
+        # image sized tensor only goes through one multiply and one add.
+        return tf.nn.batch_normalization(input, mean, variance, offset, scale, epsilon)
 
 def conv2d(input_, output_dim, ks=3, s=2, stddev=0.02, padding='SAME', name="conv2d"):
     with tf.variable_scope(name):
@@ -0,0 +1,68 @@
+# Copyright 2017 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for object_detection.ops."""
+
+import numpy as np
+import tensorflow as tf
+
+from object_detection import ops
+
+
+class InstanceNormTest(tf.test.TestCase):
+
+  def test_fused_single_instance_matches_moments(self):
+    image_np = np.random.normal(
+        3., 2., size=[1, 5, 7, 4]).astype(np.float32)
+    # a static batch of one takes the fused path, an unknown batch does not.
+    single_image = tf.placeholder(tf.float32, shape=[1, 5, 7, 4])
+    any_image = tf.placeholder(tf.float32, shape=[None, 5, 7, 4])
+    with tf.variable_scope('norm', reuse=tf.AUTO_REUSE):
+      fused_norm = ops.instance_norm(single_image)
+      moments_norm = ops.instance_norm(any_image)
+      scale = tf.get_variable('instance_norm/scale')
+      offset = tf.get_variable('instance_norm/offset')
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      fused_norm_out, moments_norm_out, scale_out, offset_out = sess.run(
+          [fused_norm, moments_norm, scale, offset],
+          feed_dict={single_image: image_np, any_image: image_np})
+      mean = image_np.mean(axis=(1, 2), keepdims=True)
+      variance = image_np.var(axis=(1, 2), keepdims=True)
+      expected_norm = ((image_np - mean) / np.sqrt(variance + 1e-5) *
+                       scale_out + offset_out)
+      self.assertAllClose(fused_norm_out, moments_norm_out, atol=1e-4)
+      self.assertAllClose(fused_norm_out, expected_norm, atol=1e-4)
+
+  def test_normalizes_each_instance(self):
+    image_np = np.stack([
+        np.random.normal(0., 1., size=[5, 7, 4]),
+        np.random.normal(10., 5., size=[5, 7, 4])]).astype(np.float32)
+    image = tf.placeholder(tf.float32, shape=[2, 5, 7, 4])
+    norm = ops.instance_norm(image)
+
+    with self.test_session() as sess:
+      sess.run(tf.global_variables_initializer())
+      norm_out = sess.run(norm, feed_dict={image: image_np})
+      self.assertAllEqual(norm_out.shape, [2, 5, 7, 4])
+      # the instances are normalized independently of each other.
+      self.assertAllClose(norm_out[:1], sess.run(
+          norm, feed_dict={image: np.concatenate([image_np[:1]] * 2)})[:1],
+                          atol=1e-4)
+
+
+if __name__ == '__main__':
+  tf.test.main()
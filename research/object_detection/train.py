@@ -151,6 +151,10 @@ flags.DEFINE_boolean('gaussian_noise', False,
                      'True for original + gaussian noise training.')
 flags.DEFINE_boolean('snow', False,
                      'True for original + snow effect training.')
+flags.DEFINE_boolean('half_precision_denoise', False,
+                     'True for running the denoise generator in float16.')
+flags.DEFINE_float('loss_scale', 128.,
+                   'loss scale for the float16 denoise generator gradients')
 
 FLAGS = flags.FLAGS
 
@@ -64,16 +64,10 @@ def activation_summary(x):
 def optimistic_restore(session, save_file):
   reader = tf.train.NewCheckpointReader(save_file)
   saved_shapes = reader.get_variable_to_shape_map()
-  var_names = sorted([(var.name, var.name.split(':')[0]) for var in tf.global_variables()
-                  if var.name.split(':')[0] in saved_shapes])
-  restore_vars = []
-  name2var = dict(zip(map(lambda x:x.name.split(':')[0], tf.global_variables()), tf.global_variables()))
-  with tf.variable_scope('', reuse=True):
-    for var_name, saved_var_name in var_names:
-      curr_var = name2var[saved_var_name]
-      var_shape = curr_var.get_shape().as_list()
-      if var_shape == saved_shapes[saved_var_name]:
-        restore_vars.append(curr_var)
+  name2var = {var.name.split(':')[0]: var for var in tf.global_variables()}
+  restore_vars = [var for name, var in name2var.items()
+                  if name in saved_shapes and
+                  var.get_shape().as_list() == saved_shapes[name]]
   saver = tf.train.Saver(restore_vars)
   saver.restore(session, save_file)
 
@@ -186,17 +180,14 @@ def get_salt_pepper_noise_image(image, ratio=0.01, rand_ratio=False):
   height = image_shape[1]
   width = image_shape[2]
 
-  # uniform [1 - ratio, 2 - ratio)
   ratio = tf.random_uniform([], maxval=ratio) if rand_ratio else ratio
-  random_tensor = 1. - ratio
-  random_tensor += tf.random_uniform(image_shape)
-  # 0: ratio, 1: 1 - ratio
-  binary_tensor = tf.floor(random_tensor)
+  # False: ratio, True: 1 - ratio
+  keep_mask = tf.random_uniform(image_shape) >= ratio
 
   # scale image from [-1, 1] to [0, 1]
   random_tensor2 = tf.random_uniform(image_shape)
   image = (image + 1.)/2.
-  noise_image = binary_tensor*image + (1.-binary_tensor)*random_tensor2
+  noise_image = tf.where(keep_mask, image, random_tensor2)
 
   # scaling pixel values to be in [-1, 1]).
   noise_image = tf.clip_by_value(noise_image*2.-1, -1, 1)
@@ -338,15 +329,12 @@ def gated_denoise(images, is_training, batch_size):
     if FLAGS.mixture_of_filters:
       with tf.variable_scope('filter_gate') as scope:
         print('Building mixture of filters model')
-        filtered_images0 = average_filter(images, 2)
-        filtered_images1 = average_filter(images, 3)
-        filtered_images2 = average_filter(images, 4)
-        probs = gate(images, FLAGS.ndf, num_classes=4, reuse=False, name='gate')
+        probs = gate(images, FLAGS.ndf, num_classes=4, name='gate')
         activation_summary(probs)
-        filtered_images = tf.add_n([probs[:,0,None,None,None]*images,
-                                    probs[:,1,None,None,None]*filtered_images0,
-                                    probs[:,2,None,None,None]*filtered_images1,
-                                    probs[:,3,None,None,None]*filtered_images2])
+        # the identity and the 2x2, 3x3 and 4x4 average filters are computed
+        # by one depthwise convolution and mixed in a single weighted sum.
+        filtered_images = mixture_of_average_filters(images, probs,
+                                                     filter_sizes=(1, 2, 3, 4))
     else:
       filtered_images = average_filter(images, FLAGS.filter_size)
     summaries_dict['filtered_noisy_images'] = tf.summary.image('filtered_noisy_images', filtered_images, max_outputs=1)
@@ -355,9 +343,9 @@ def gated_denoise(images, is_training, batch_size):
   if FLAGS.denoise:
     with tf.variable_scope('denoise') as scope:
       if FLAGS.generator_separate_channel:
-        denoised_images = generator_separate_resnet(filtered_images, options, res_depth=FLAGS.res_depth, reuse=False, name='generator') 
+        denoised_images = generator_separate_resnet(filtered_images, options, res_depth=FLAGS.res_depth, name='generator') 
       else:
-        denoised_images = generator_resnet(filtered_images, options, res_depth=FLAGS.res_depth, output_c_dim=3, reuse=False, name='generator') 
+        denoised_images = generator_resnet(filtered_images, options, res_depth=FLAGS.res_depth, output_c_dim=3, name='generator') 
       denoise_sim_loss = abs_criterion(denoised_images[:noisy_batch_size], original_images, name='g_loss/sim_loss')
       g_loss = FLAGS.denoise_loss_factor * denoise_sim_loss
       losses_dict['g_loss'] = g_loss
@@ -365,10 +353,10 @@ def gated_denoise(images, is_training, batch_size):
       if FLAGS.denoise_discrim:
         noisy_and_denoised = tf.concat([noisy_images, denoised_images[:noisy_batch_size]], 3)
         noisy_and_original = tf.concat([noisy_images, original_images], 3)
-#        d_denoised = discriminator(noisy_and_denoised, FLAGS.ndf, FLAGS.ks, reuse=False, name='discriminator')
-#        d_original = discriminator(noisy_and_original, FLAGS.ndf, FLAGS.ks, reuse=True,  name='discriminator')
-        d_denoised = discriminator(denoised_images[:noisy_batch_size], FLAGS.ndf, FLAGS.ks, reuse=False, name='discriminator')
-        d_original = discriminator(original_images, FLAGS.ndf, FLAGS.ks, reuse=True,  name='discriminator')
+#        d_denoised = discriminator(noisy_and_denoised, FLAGS.ndf, FLAGS.ks, name='discriminator')
+#        d_original = discriminator(noisy_and_original, FLAGS.ndf, FLAGS.ks, name='discriminator')
+        d_denoised = discriminator(denoised_images[:noisy_batch_size], FLAGS.ndf, FLAGS.ks, name='discriminator')
+        d_original = discriminator(original_images, FLAGS.ndf, FLAGS.ks, name='discriminator')
 
         # generator loss
         g_gan_loss = criterionGAN(d_denoised, tf.ones_like(d_denoised))
@@ -395,7 +383,7 @@ def gated_denoise(images, is_training, batch_size):
   # Gate Operation
   if FLAGS.discrim:
     with tf.variable_scope('input_discrim') as scope:
-      d_in_logits = discriminator(images, FLAGS.ndf, FLAGS.ks, reuse=False, name='discriminator')
+      d_in_logits = discriminator(images, FLAGS.ndf, FLAGS.ks, name='discriminator')
 
       d_in_loss_real = criterionGAN2(d_in_logits[noisy_batch_size:],  tf.ones_like(d_in_logits[noisy_batch_size:]))
       d_in_loss_fake = criterionGAN2(d_in_logits[:noisy_batch_size], tf.zeros_like(d_in_logits[:noisy_batch_size]))